@@ -0,0 +1,296 @@
+"""Search-based computer opponent.
+
+SearchPlayer runs an expectimax search over the headless RulesEngine: the
+AI's actions are max nodes, the opponent's are min nodes, and every attack
+is a chance node whose children are the possible combat results (dodges,
+gray-terrain trades, General Warrior counter-attacks) weighted by their
+probability in COMBAT_TABLE. Depth is counted in actions, so depth 2 is
+one full turn.
+
+The search deepens iteratively until its time or node budget runs out and
+plays the best action of the deepest finished iteration. With more than
+one worker the root actions are split across a process pool.
+
+The search plays and takes back actions on one copy of the root state
+with RulesEngine.apply() and undo(), so no node copies the state.
+
+Positions reached again, through another order of the same actions or in
+a later iteration, are looked up in a transposition table keyed by their
+Zobrist key instead of being searched again.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from movegen import decode, legal_actions
+from rules_engine import (BOARD_SIZE, COMBAT_TABLE, COUNTER_KILL, KILL, MUTUAL_KILL, OWNER, PIECE_CODES, PIECE_KINDS,
+                          RulesEngine, is_tower)
+from units import UNITS
+from zobrist import EXACT, LOWER, NO_ACTION, SIDE_KEYS, UPPER, TranspositionTable, position_key
+
+WIN_SCORE = 10000.0
+PIECE_VALUES = {kind: unit.value for kind, unit in UNITS.items()}
+TOWER_HP_VALUE = 1.0  # Score of one tower hit point
+APPROACH_VALUE = 0.1  # Score per square a unit is closer to the enemy tower
+TOWER_ATTACK_VALUE = 2.0  # Ordering bonus for hitting the enemy tower
+CHECK_EVERY = 256  # Nodes between two looks at the clock
+
+CODE_VALUES = tuple(PIECE_VALUES[kind] if kind else 0.0 for kind in PIECE_KINDS)  # PIECE_VALUES by piece code
+TOWER_CODES = (bytes([PIECE_CODES['T1']]), bytes([PIECE_CODES['T2']]))
+# APPROACH[tower square][square]: score of a unit on square for being close to the enemy tower (king-step distance)
+APPROACH = [[APPROACH_VALUE * (BOARD_SIZE - 1 - max(abs(tower // BOARD_SIZE - square // BOARD_SIZE),
+                                                      abs(tower % BOARD_SIZE - square % BOARD_SIZE)))
+             for square in range(BOARD_SIZE * BOARD_SIZE)] for tower in range(BOARD_SIZE * BOARD_SIZE)]
+TABLE_SIZE = 1 << 16  # Transposition table slots
+
+# Values are from the searching player's point of view, so the player is part of the table key
+SEARCHER_KEYS = {'P1': 0, 'P2': SIDE_KEYS['searcher', 'P2']}
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+class _Budget:
+    """Counts nodes and stops the search once the deadline or node limit is reached."""
+
+    def __init__(self, deadline, node_limit):
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.enforced = True
+
+    def tick(self):
+        self.nodes += 1
+        if not self.enforced:
+            return
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise _OutOfBudget
+        if self.nodes % CHECK_EVERY == 0 and time.time() >= self.deadline:
+            raise _OutOfBudget
+
+
+def combat_key(state, action):
+    """Return the COMBAT_TABLE key of an attack on a unit, or None for moves and tower attacks."""
+    from_square, to_square, is_attack = decode(action)
+    if not is_attack:
+        return None
+    defender = state.board[to_square]
+    if is_tower(defender):
+        return None
+    terrain = state.terrain
+    return PIECE_KINDS[state.board[from_square]], PIECE_KINDS[defender], terrain[from_square], terrain[to_square]
+
+
+# Plays and takes back the actions of the search tree; every attack gets a forced outcome, so it never rolls
+_engine = RulesEngine(seed=0)
+
+
+def attack_value(state, action):
+    """Expected material swing of an attack for the attacker, read straight from COMBAT_TABLE."""
+    from_square, to_square, is_attack = decode(action)
+    if not is_attack:
+        return 0.0
+    key = combat_key(state, action)
+    if key is None:
+        return TOWER_ATTACK_VALUE
+    attacker, defender = PIECE_VALUES[key[0]], PIECE_VALUES[key[1]]
+    value = 0.0
+    for probability, outcome in COMBAT_TABLE[key]:
+        if outcome in (KILL, MUTUAL_KILL):
+            value += probability * defender
+        if outcome in (MUTUAL_KILL, COUNTER_KILL):
+            value -= probability * attacker
+    return value
+
+
+def evaluate(state, player):
+    """Heuristic score of state from player's point of view."""
+    if state.winner:
+        return WIN_SCORE if state.winner == player else -WIN_SCORE
+
+    board = state.board
+    towers = (board.find(TOWER_CODES[0]), board.find(TOWER_CODES[1]))  # -1 once destroyed
+    mine = OWNER[player]
+    score = TOWER_HP_VALUE * (state.tower_hp[mine] - state.tower_hp[1 - mine])
+    for square, piece in enumerate(board):
+        if not piece or is_tower(piece):
+            continue
+        owner = piece & 1
+        value = CODE_VALUES[piece]
+        target = towers[1 - owner]
+        if target >= 0:
+            value += APPROACH[target][square]
+        score += value if owner == mine else -value
+    return score
+
+
+def _ordered(state, actions, first=NO_ACTION):
+    """Try first (the best action found for this position before), then the most promising attacks, then moves."""
+    return sorted(actions, key=lambda action: -float('inf') if action == first else -attack_value(state, action))
+
+
+def _search(engine, depth, alpha, beta, player, budget, table):
+    state = engine.state
+    budget.tick()
+    if depth == 0 or state.winner:
+        return evaluate(state, player)
+
+    key = position_key(state) ^ SEARCHER_KEYS[player]
+    entry = table.probe(key)
+    first = NO_ACTION
+    if entry is not None:
+        stored_depth, value, bound, first = entry
+        if stored_depth >= depth:
+            if bound == EXACT:
+                return value
+            if bound == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+    actions = legal_actions(state, state.turn)
+    if not actions:
+        return evaluate(state, player)
+
+    maximizing = state.turn == player
+    best = -float('inf') if maximizing else float('inf')
+    best_action = NO_ACTION
+    window = alpha, beta
+    for action in _ordered(state, actions, first):
+        value = _action_value(engine, action, depth, alpha, beta, player, budget, table)
+        if maximizing:
+            if value > best:
+                best, best_action = value, action
+            alpha = max(alpha, best)
+        else:
+            if value < best:
+                best, best_action = value, action
+            beta = min(beta, best)
+        if alpha >= beta:
+            break
+
+    bound = UPPER if best <= window[0] else LOWER if best >= window[1] else EXACT
+    table.store(key, depth, best, bound, best_action)
+    return best
+
+
+def _action_value(engine, action, depth, alpha, beta, player, budget, table):
+    """Expected value of playing action in the engine's state, searching depth - 1 actions below it."""
+    key = combat_key(engine.state, action)
+    if key is None:
+        record = engine.apply(action)
+        value = _search(engine, depth - 1, alpha, beta, player, budget, table)
+        engine.undo(record)
+        return value
+    # Chance node: the children are averaged, so their bounds can't be narrowed
+    value = 0.0
+    for probability, outcome in COMBAT_TABLE[key]:
+        record = engine.apply(action, outcome)
+        value += probability * _search(engine, depth - 1, -float('inf'), float('inf'), player, budget, table)
+        engine.undo(record)
+    return value
+
+
+_table = None  # Transposition table of searches run in this process without one of their own
+
+
+def search_actions(state, actions, max_depth, deadline, node_limit=None, table=None):
+    """Iteratively deepen over the given root actions.
+
+    Returns {depth: {action: value}} for every iteration that finished.
+    Depth 1 always finishes, whatever the budget. table defaults to one
+    TranspositionTable per process, which is how pool workers keep theirs
+    between moves.
+    """
+    global _table
+    if table is None:
+        if _table is None:
+            _table = TranspositionTable(TABLE_SIZE)
+        table = _table
+    table.new_search()
+
+    player = state.turn
+    engine = _engine
+    engine.state = state.copy()  # Left half-played when the budget runs out, so the caller's state stays untouched
+    budget = _Budget(deadline, node_limit)
+    completed = {}
+    order = list(actions)
+    for depth in range(1, max_depth + 1):
+        budget.enforced = depth > 1
+        values = {}
+        try:
+            for action in order:
+                values[action] = _action_value(engine, action, depth, -float('inf'), float('inf'), player, budget,
+                                               table)
+        except _OutOfBudget:
+            break
+        completed[depth] = values
+        order.sort(key=values.get, reverse=True)  # Best first for the next iteration
+    return completed
+
+
+class SearchPlayer:
+    """Expectimax player with a time and/or node budget per move.
+
+    time_limit=None searches until the node budget or max_depth is reached,
+    which makes the choice of action reproducible.
+
+    workers defaults to the number of CPUs; with more than one, the root
+    actions are split over a process pool that lives as long as the player
+    (call close() when done), and each worker keeps its own transposition
+    table. Otherwise the table is self.table, kept from move to move until
+    new_game().
+
+    With a tablebase (tablebase.Tablebase), positions it covers are played
+    from the tablebase without searching.
+    """
+
+    def __init__(self, time_limit=0.2, node_limit=None, max_depth=6, workers=None, table_size=TABLE_SIZE,
+                 tablebase=None):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        self.table = TranspositionTable(table_size) if self.pool is None else None
+        self.tablebase = tablebase
+
+    def new_game(self):
+        """Forget the positions of the previous game."""
+        if self.table is not None:
+            self.table.clear()
+
+    def choose_action(self, state):
+        """Return the action code to play in state, or None if there is none."""
+        actions = legal_actions(state, state.turn)
+        if len(actions) <= 1:
+            return actions[0] if actions else None
+        if self.tablebase is not None:
+            action = self.tablebase.best_action(state)
+            if action is not None:
+                return action
+
+        deadline = time.time() + self.time_limit if self.time_limit is not None else float('inf')
+        if self.pool is None:
+            results = [search_actions(state, actions, self.max_depth, deadline, self.node_limit, self.table)]
+        else:
+            node_limit = self.node_limit and max(1, self.node_limit // self.workers)
+            chunks = [actions[i::self.workers] for i in range(self.workers)]
+            futures = [self.pool.submit(search_actions, state, chunk, self.max_depth, deadline, node_limit)
+                       for chunk in chunks if chunk]
+            results = [future.result() for future in futures]
+
+        # Compare every action at the deepest depth all the workers finished
+        depth = min(max(completed) for completed in results)
+        values = {}
+        for completed in results:
+            values.update(completed[depth])
+        return max(values, key=values.get)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,204 @@
+"""Vectorized scoring of many positions at once. Needs NumPy.
+
+A BoardBatch holds N positions as arrays:
+
+    pieces    (N, 8, 8) int8, the type code of each piece (1 + its index in
+              PIECE_TYPES), positive for Player 1 and negative for Player 2
+    terrain   (N, 8, 8) uint8 terrain codes
+    tower_hp  (N, 2) hit points of T1 and T2
+    winner    (N,) 0 while the game is on, else 1 or 2
+
+The functions below work on one uint64 bitboard per position and piece
+plane (bit row * 8 + col, as in bitboards.py), so a movement or attack
+offset is a shift and an AND over the whole batch. The offsets are taken
+from the bitboards masks, so the counts agree with movegen.legal_actions.
+"""
+import numpy as np
+
+from ai_player import APPROACH_VALUE, PIECE_VALUES, TOWER_HP_VALUE, WIN_SCORE
+from bitboards import ATTACK_MASKS, MOVE_MASKS, iter_squares
+from rules_engine import BLUE, BOARD_SIZE, RED, UNIT_TYPES
+
+PIECE_TYPES = UNIT_TYPES + ('T',)
+TYPE_CODES = {kind: code for code, kind in enumerate(PIECE_TYPES, 1)}
+TOWER = TYPE_CODES['T']
+PLAYERS = ('P1', 'P2')
+SIGNS = (1, -1)  # Sign of each player's piece codes
+
+# Score of a piece by type code; code 0 (empty square) is worth nothing
+_VALUES = np.array([0.0] + [PIECE_VALUES[kind] for kind in PIECE_TYPES])
+
+
+def _offsets(masks):
+    """Return the (dr, dc) offsets that occur in a table of per-square masks."""
+    offsets = set()
+    for square, mask in enumerate(masks):
+        row, col = divmod(square, BOARD_SIZE)
+        for target in iter_squares(mask):
+            offsets.add((target // BOARD_SIZE - row, target % BOARD_SIZE - col))
+    return sorted(offsets)
+
+
+def _shift_of(dr, dc):
+    """Return (bit shift, mask of the target squares) that moves a bitboard dr rows and dc columns."""
+    mask = 0
+    for row in range(max(dr, 0), BOARD_SIZE + min(dr, 0)):
+        for col in range(max(dc, 0), BOARD_SIZE + min(dc, 0)):
+            mask |= 1 << (row * BOARD_SIZE + col)
+    return dr * BOARD_SIZE + dc, np.uint64(mask)
+
+
+# Per type code: [(shift, target mask)] for every offset the type can move or attack to
+MOVE_SHIFTS = {TYPE_CODES[kind]: [_shift_of(*offset) for offset in _offsets(MOVE_MASKS[kind])]
+               for kind in PIECE_TYPES}
+ATTACK_SHIFTS = {TYPE_CODES[kind]: [_shift_of(*offset) for offset in _offsets(ATTACK_MASKS[kind])]
+                 for kind in PIECE_TYPES}
+
+if hasattr(np, 'bitwise_count'):  # NumPy 2.0 and later
+    def _popcount(boards):
+        return np.bitwise_count(boards).astype(np.int32)
+else:
+    _BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int32)
+
+    def _popcount(boards):
+        return _BYTE_COUNTS[boards.view(np.uint8).reshape(len(boards), 8)].sum(axis=1)
+
+
+def _shifted(boards, shift, mask):
+    """Move every bit of a bitboard array by shift squares, keeping only bits that land in mask."""
+    if shift >= 0:
+        return (boards << np.uint64(shift)) & mask
+    return (boards >> np.uint64(-shift)) & mask
+
+
+def to_bitboards(planes):
+    """Pack (N, 8, 8) bool planes into (N,) uint64 bitboards."""
+    packed = np.packbits(planes.reshape(len(planes), -1), axis=1, bitorder='little')
+    return packed.view('<u8').reshape(len(planes)).astype(np.uint64)
+
+
+def from_bitboards(boards):
+    """Unpack (N,) uint64 bitboards into (N, 8, 8) bool planes."""
+    packed = boards.astype('<u8').view(np.uint8).reshape(len(boards), 8)
+    return np.unpackbits(packed, axis=1, bitorder='little').reshape(len(boards), BOARD_SIZE, BOARD_SIZE).view(bool)
+
+
+class BoardBatch:
+    """N positions stored as arrays, see the module docstring."""
+
+    def __init__(self, pieces, terrain, tower_hp, winner=None):
+        self.pieces = np.asarray(pieces, dtype=np.int8)
+        self.terrain = np.asarray(terrain, dtype=np.uint8)
+        self.tower_hp = np.asarray(tower_hp, dtype=np.int16)
+        self.winner = np.zeros(len(self.pieces), dtype=np.int8) if winner is None else np.asarray(winner, np.int8)
+
+    @classmethod
+    def from_states(cls, states):
+        """Pack GameStates into a batch."""
+        shape = (len(states), BOARD_SIZE, BOARD_SIZE)
+        codes = np.frombuffer(b''.join(state.board for state in states), dtype=np.uint8).reshape(shape)
+        # Engine piece codes are type << 1 | owner, with types numbered like TYPE_CODES
+        pieces = ((codes >> 1) * np.where(codes & 1, -1, 1)).astype(np.int8)
+        terrain = np.frombuffer(b''.join(state.terrain for state in states), dtype=np.uint8).reshape(shape).copy()
+        tower_hp = np.array([state.tower_hp for state in states], dtype=np.int16).reshape(len(states), 2)
+        winner = np.array([PLAYERS.index(state.winner) + 1 if state.winner else 0 for state in states], dtype=np.int8)
+        return cls(pieces, terrain, tower_hp, winner)
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def terrain_planes(self):
+        """Return (N, 4, 8, 8) bool planes, one per terrain code."""
+        return self.terrain[:, None] == np.arange(4, dtype=np.uint8)[None, :, None, None]
+
+    def occupied(self, player):
+        """(N, 8, 8) bool mask of the player's pieces, towers included."""
+        return self.pieces > 0 if player == 'P1' else self.pieces < 0
+
+    def planes(self, player, code):
+        """(N, 8, 8) bool mask of the player's pieces of one type code."""
+        return self.pieces == code * SIGNS[PLAYERS.index(player)]
+
+
+def _attack_boards(batch, player, where=None):
+    """(N,) bitboards of the squares the player's units attack, from squares in where if given."""
+    attacked = np.zeros(len(batch), dtype=np.uint64)
+    for code, shifts in ATTACK_SHIFTS.items():
+        if not shifts:
+            continue
+        boards = to_bitboards(batch.planes(player, code))
+        if where is not None:
+            boards &= where
+        for shift, mask in shifts:
+            attacked |= _shifted(boards, shift, mask)
+    return attacked
+
+
+def attack_maps(batch):
+    """(N, 2, 8, 8) bool map of the squares each player has in attack range."""
+    return np.stack([from_bitboards(_attack_boards(batch, player)) for player in PLAYERS], axis=1)
+
+
+def legal_action_counts(batch):
+    """(N, 2) number of moves plus attacks each player could make if it were their turn.
+
+    Matches len(movegen.legal_actions(state, player)) for a game still on,
+    with actions left in the turn.
+    """
+    free = to_bitboards((batch.pieces == 0) & (batch.terrain != BLUE))
+    off_red = to_bitboards(batch.terrain != RED)
+    counts = np.zeros((len(batch), 2), dtype=np.int32)
+    for index, player in enumerate(PLAYERS):
+        enemy = PLAYERS[1 - index]
+        towers = to_bitboards(batch.planes(enemy, TOWER))
+        units = to_bitboards(batch.occupied(enemy)) & ~towers
+        for code in TYPE_CODES.values():
+            if not MOVE_SHIFTS[code] and not ATTACK_SHIFTS[code]:
+                continue
+            boards = to_bitboards(batch.planes(player, code))
+            for shift, mask in MOVE_SHIFTS[code]:
+                counts[:, index] += _popcount(_shifted(boards, shift, mask) & free)
+            for shift, mask in ATTACK_SHIFTS[code]:
+                counts[:, index] += _popcount(_shifted(boards, shift, mask) & units)
+                counts[:, index] += _popcount(_shifted(boards & off_red, shift, mask) & towers)  # Not from red
+    return counts
+
+
+def evaluate(batch, player, threat_value=0.0):
+    """(N,) heuristic scores from player's point of view.
+
+    With threat_value=0 this is ai_player.evaluate for every position.
+    Otherwise each enemy unit in range of one of the player's attacks adds
+    threat_value and each of the player's units in enemy range takes it off.
+    """
+    mine = PLAYERS.index(player)
+    count = len(batch)
+    rows = np.arange(BOARD_SIZE)[:, None]
+    cols = np.arange(BOARD_SIZE)[None, :]
+
+    signed_codes = batch.pieces.astype(np.int16) * SIGNS[mine]  # Positive for the player's pieces
+    codes = np.abs(signed_codes)
+    units = (codes > 0) & (codes != TOWER)
+    score = np.where(units, _VALUES[codes] * np.sign(signed_codes), 0.0).sum(axis=(1, 2))
+    score += TOWER_HP_VALUE * (batch.tower_hp[:, mine] - batch.tower_hp[:, 1 - mine])
+
+    # Units score more the closer they are to the enemy tower (king-step distance)
+    for index, owner in enumerate(PLAYERS):
+        towers = batch.planes(PLAYERS[1 - index], TOWER).reshape(count, -1)
+        has_tower = towers.any(axis=1)
+        tower_row, tower_col = np.divmod(towers.argmax(axis=1), BOARD_SIZE)
+        distance = np.maximum(np.abs(rows - tower_row[:, None, None]), np.abs(cols - tower_col[:, None, None]))
+        owned = units & batch.occupied(owner)
+        approach = (APPROACH_VALUE * (BOARD_SIZE - 1 - distance) * owned).sum(axis=(1, 2))
+        score += np.where(has_tower, approach, 0.0) * (1 if index == mine else -1)
+
+    if threat_value:
+        theirs = PLAYERS[1 - mine]
+        my_units = to_bitboards(units & (signed_codes > 0))
+        their_units = to_bitboards(units & (signed_codes < 0))
+        score += threat_value * (_popcount(_attack_boards(batch, player) & their_units) -
+                                 _popcount(_attack_boards(batch, theirs) & my_units))
+
+    won = batch.winner == mine + 1
+    lost = (batch.winner != 0) & ~won
+    return np.where(won, WIN_SCORE, np.where(lost, -WIN_SCORE, score))
@@ -0,0 +1,219 @@
+"""Benchmark suite with saved baselines.
+
+Measures a fixed set of workloads in operations per second, best of a few
+repeats, and compares them with benchmark_baselines.json:
+
+    python benchmarks.py                 # Run, compare, exit 1 on a regression
+    python benchmarks.py --save          # Run and store the results as the new baselines
+    python benchmarks.py --only attack   # Only workloads whose name contains 'attack'
+    xvfb-run python benchmarks.py        # Include the GUI redraw on a virtual display
+
+A workload regresses when it runs more than --threshold (default 20%)
+slower than its baseline. A workload that looks regressed is measured
+again up to --retries times, keeping its best result, so a noisy moment
+on a shared machine does not fail the run. Baselines only mean something
+on the machine they were saved on, so save them again after moving to
+another one.
+
+Workloads:
+    validate_<type>   is_valid_move and is_valid_attack from one square to every square
+    attack_<terrain>  unit-on-unit attacks with a rolled outcome, undone after each
+    playout           random games from the place_pieces layout, in games per second
+    terrain           terrain maps generated and scored for fairness
+    gui_redraw        ChessGame.update_board, skipped without a display
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import timeit
+
+from movegen import ATTACK, encode, legal_actions, perform
+from rules_engine import BOARD_SIZE, GRAY, GREEN, PIECE_CODES, RED, UNIT_TYPES, RulesEngine
+from terrain import TerrainGenerator, score_terrain
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+THRESHOLD = 0.2  # Allowed slowdown against the baseline
+REPEAT = 5
+RETRIES = 2
+CENTER = 3 * BOARD_SIZE + 3  # Square the validation and attack workloads use
+PLAYOUT_ACTIONS = 2000
+PLAYOUT_SEEDS = 16  # Playouts cycle through the same games, so every run plays the same mix
+
+
+def _engine(pieces, terrain=()):
+    """A seeded engine with only the given {square: piece name} on the board and the given {square: terrain}."""
+    engine = RulesEngine(seed=0)
+    for square, piece in pieces.items():
+        engine.state.board[square] = PIECE_CODES[piece]
+    for square, code in terrain:
+        engine.state.terrain[square] = code
+    engine.state.recount()
+    return engine
+
+
+def validation(kind):
+    engine = _engine({CENTER: kind + '1'})
+    row, col = divmod(CENTER, BOARD_SIZE)
+    targets = [divmod(square, BOARD_SIZE) for square in range(BOARD_SIZE * BOARD_SIZE)]
+    is_valid_move, is_valid_attack = engine.is_valid_move, engine.is_valid_attack
+
+    def run():
+        for target_row, target_col in targets:
+            is_valid_move(row, col, target_row, target_col)
+            is_valid_attack(row, col, target_row, target_col)
+
+    return run, 2 * len(targets)
+
+
+def attack(attacker_terrain, defender_terrain):
+    # A General Warrior defender also exercises the counter-attack paths; towers keep the game from ending
+    target = CENTER + 1
+    engine = _engine({CENTER: 'P1', target: 'GW2', 0: 'T1', BOARD_SIZE * BOARD_SIZE - 1: 'T2', 1: 'P1', 2: 'P2'},
+                     [(CENTER, attacker_terrain), (target, defender_terrain)])
+    action = encode(CENTER, target, ATTACK)
+    apply, undo = engine.apply, engine.undo
+
+    def run():
+        for _ in range(100):
+            undo(apply(action))
+
+    return run, 100
+
+
+def playout():
+    seeds = itertools.cycle(range(PLAYOUT_SEEDS))
+
+    def run():
+        seed = next(seeds)
+        engine = RulesEngine(seed=seed)
+        engine.generate_terrain()
+        engine.place_pieces()
+        rng = random.Random(seed)
+        state = engine.state
+        for _ in range(PLAYOUT_ACTIONS):
+            actions = legal_actions(state, state.turn)
+            if state.winner or not actions:
+                break
+            perform(engine, rng.choice(actions))
+
+    return run, 1
+
+
+def terrain():
+    generator = TerrainGenerator()
+    rng = random.Random(0)
+
+    def run():
+        for _ in range(10):
+            score_terrain(generator.generate(rng)).fair()
+
+    return run, 10
+
+
+def gui_redraw():
+    """Returns None when there is no display (or no tkinter or PIL) to draw on."""
+    try:
+        import tkinter as tk
+
+        from chess_game import ChessGame
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    game = ChessGame(root, seed=0)
+
+    def run():
+        game.update_board()
+        root.update_idletasks()
+
+    return run, 1
+
+
+WORKLOADS = {f'validate_{kind}': (validation, kind) for kind in UNIT_TYPES}
+WORKLOADS.update({
+    'attack_green': (attack, GREEN, GREEN),
+    'attack_from_red': (attack, RED, GREEN),  # No dodging
+    'attack_onto_gray': (attack, GREEN, GRAY),  # Mutual kills
+    'playout': (playout,),
+    'terrain': (terrain,),
+    'gui_redraw': (gui_redraw,),
+})
+
+
+def measure(setup, repeat=REPEAT):
+    """Return the operations per second of a workload, best of repeat runs, or None if it was skipped."""
+    workload = setup[0](*setup[1:])
+    if workload is None:
+        return None
+    run, ops = workload
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number))
+    return number * ops / best
+
+
+def compare(results, baselines, threshold=THRESHOLD):
+    """Return (name, result, baseline, change) for every result with a baseline, and the names that regressed."""
+    rows, regressed = [], []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        change = result / baseline - 1 if baseline else None
+        rows.append((name, result, baseline, change))
+        if change is not None and change < -threshold:
+            regressed.append(name)
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmarks and compare them with the saved baselines.")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--only', default='', help="only run workloads whose name contains this")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed slowdown, e.g. 0.2 for 20%%")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--retries', type=int, default=RETRIES, help="re-runs of a workload that looks regressed")
+    parser.add_argument('--baselines', default=BASELINES)
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as stream:
+            baselines = json.load(stream)
+
+    results = {}
+    for name, setup in WORKLOADS.items():
+        if args.only not in name:
+            continue
+        result = measure(setup, args.repeat)
+        if result is None:
+            print(f"{name:<20} skipped")
+            continue
+        results[name] = result
+
+    rows, regressed = compare(results, baselines, args.threshold)
+    for _ in range(args.retries if not args.save else 0):
+        if not regressed:
+            break
+        for name in regressed:
+            results[name] = max(results[name], measure(WORKLOADS[name], args.repeat))
+        rows, regressed = compare(results, baselines, args.threshold)
+    for name, result, baseline, change in rows:
+        against = f"{baseline:>14.1f}  {change:+7.1%}" if baseline else f"{'-':>14}  {'new':>7}"
+        flag = "  REGRESSION" if name in regressed else ""
+        print(f"{name:<20}{result:>14.1f} ops/s{against}{flag}")
+
+    if args.save:
+        baselines.update((name, round(result, 1)) for name, result in results.items())
+        with open(args.baselines, 'w') as stream:
+            json.dump(dict(sorted(baselines.items())), stream, indent=2)
+            stream.write('\n')
+        print(f"Saved {len(results)} baselines to {args.baselines}")
+    elif regressed:
+        print(f"{len(regressed)} workloads regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Optional 64-bit bitboard view of a GameState.
+
+Square numbers follow GameState.terrain: square = row * BOARD_SIZE + col,
+and bit (1 << square) stands for that square. The move and attack masks
+below are built once at import time, so asking where a piece can go is a
+table lookup and an AND instead of abs() arithmetic per square pair.
+"""
+from rules_engine import BOARD_SIZE, BLUE, PIECE_KINDS
+from units import CROSS_3, CROSS_4, UNITS, gallop, nowhere, step
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+PLAYERS = ('P1', 'P2')  # Indexed by the owner bit of a piece code
+
+
+def _build_masks(reaches):
+    """Build one mask per square from reaches(dr, dc), which says if a square dr rows and dc columns away counts."""
+    masks = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            mask = 0
+            for to_row in range(BOARD_SIZE):
+                for to_col in range(BOARD_SIZE):
+                    dr, dc = abs(to_row - row), abs(to_col - col)
+                    if (dr or dc) and reaches(dr, dc):
+                        mask |= 1 << (to_row * BOARD_SIZE + to_col)
+            masks.append(mask)
+    return masks
+
+
+# Masks of the unit registry patterns; units with the same pattern share one list
+KING_STEPS = _build_masks(step)  # One square in any direction; also the melee attack range
+HORSE_MOVES = _build_masks(gallop)  # Up to 3 squares in cross or diagonal direction, jumping
+ARCHER_ATTACKS = _build_masks(CROSS_3)  # 1-3 squares in cross direction
+GH_ATTACKS = _build_masks(CROSS_4)  # 1-4 squares in cross direction
+NO_SQUARES = [0] * NUM_SQUARES
+_PATTERN_MASKS = {step: KING_STEPS, gallop: HORSE_MOVES, CROSS_3: ARCHER_ATTACKS, CROSS_4: GH_ATTACKS,
+                  nowhere: NO_SQUARES}
+
+
+def _masks_for(pattern):
+    if pattern not in _PATTERN_MASKS:
+        _PATTERN_MASKS[pattern] = _build_masks(pattern)
+    return _PATTERN_MASKS[pattern]
+
+
+# Indexed by piece type (the piece string without its player digit)
+MOVE_MASKS = {kind: _masks_for(unit.moves) for kind, unit in UNITS.items()}
+ATTACK_MASKS = {kind: _masks_for(unit.attacks) for kind, unit in UNITS.items()}
+
+
+def piece_type(piece):
+    """Return the type part of a piece string, e.g. 'GW' for 'GW1'."""
+    return piece[:-1]
+
+
+def iter_squares(mask):
+    """Yield the square numbers of the bits set in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def terrain_mask(terrain, code):
+    """Return the mask of squares whose terrain is code."""
+    mask = 0
+    for square, value in enumerate(terrain):
+        if value == code:
+            mask |= 1 << square
+    return mask
+
+
+class Bitboards:
+    """Per-piece-type occupancy masks for both players.
+
+    pieces[(piece_type, player)] is the mask of squares holding that kind of
+    piece; occupied[player] is the union for a player. The masks can be kept
+    in sync with the board through move_piece and remove_piece.
+    """
+
+    def __init__(self, terrain):
+        self.pieces = {}
+        self.occupied = {'P1': 0, 'P2': 0}
+        self.squares = [None] * NUM_SQUARES  # (piece_type, player) per square
+        self.water = terrain_mask(terrain, BLUE)
+
+    @classmethod
+    def from_state(cls, state):
+        """Build the bitboards for a GameState."""
+        bitboards = cls(state.terrain)
+        for square, piece in enumerate(state.board):
+            if piece:
+                bitboards.add_piece(square, PIECE_KINDS[piece], PLAYERS[piece & 1])
+        return bitboards
+
+    @property
+    def empty(self):
+        """Mask of squares with no piece on them."""
+        return ~(self.occupied['P1'] | self.occupied['P2']) & ((1 << NUM_SQUARES) - 1)
+
+    def add_piece(self, square, kind, player):
+        bit = 1 << square
+        key = (kind, player)
+        self.pieces[key] = self.pieces.get(key, 0) | bit
+        self.occupied[player] |= bit
+        self.squares[square] = key
+
+    def remove_piece(self, square):
+        key = self.squares[square]
+        if key is None:
+            return
+        bit = 1 << square
+        self.pieces[key] &= ~bit
+        self.occupied[key[1]] &= ~bit
+        self.squares[square] = None
+
+    def move_piece(self, from_square, to_square):
+        kind, player = self.squares[from_square]
+        self.remove_piece(from_square)
+        self.add_piece(to_square, kind, player)
+
+    def move_targets(self, square):
+        """Mask of squares the piece on square can move to: empty, not water, in range."""
+        kind, _ = self.squares[square]
+        return MOVE_MASKS[kind][square] & self.empty & ~self.water
+
+    def attack_targets(self, square):
+        """Mask of enemy pieces in attack range of the piece on square."""
+        kind, player = self.squares[square]
+        enemy = 'P2' if player == 'P1' else 'P1'
+        return ATTACK_MASKS[kind][square] & self.occupied[enemy]
+
+    def moves(self, player):
+        """Yield every (from_square, to_square) move the player's pieces can make."""
+        free = self.empty & ~self.water
+        for (kind, owner), mask in self.pieces.items():
+            if owner != player:
+                continue
+            table = MOVE_MASKS[kind]
+            for square in iter_squares(mask):
+                for target in iter_squares(table[square] & free):
+                    yield square, target
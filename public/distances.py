@@ -0,0 +1,145 @@
+"""Fewest-move distance fields over a terrain map.
+
+Water blocks every unit, but a horse jumps over it (and over anything
+else in its way) while pawns, archers and generals step one square at a
+time. A DistanceField holds, for one movement pattern from the bitboards
+MOVE_MASKS and one set of blocked squares, the fewest moves from every
+square to every other square, found by one bitboard BFS per source.
+
+DistanceMaps groups the fields of one terrain map, adds the number of
+moves each unit type needs to get a shot at each tower, and keeps a few
+fields for the occupied squares it was last asked about. Maps for a
+terrain are shared through distance_maps(), so each map is computed
+once per process.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+
+from bitboards import ATTACK_MASKS, MOVE_MASKS, NUM_SQUARES, iter_squares, terrain_mask
+from rules_engine import BLUE, RED
+
+UNREACHABLE = 255
+ALL_SQUARES = (1 << NUM_SQUARES) - 1
+
+
+def bfs(sources, masks, free):
+    """Return a bytearray of the fewest moves from any square in the sources mask to each square.
+
+    masks[square] are the squares a move from square can reach and free
+    is the mask of squares a move may end on. The sources themselves need
+    not be free.
+    """
+    distances = bytearray([UNREACHABLE]) * NUM_SQUARES
+    frontier = seen = sources
+    distance = 0
+    while frontier:
+        reach = 0
+        for square in iter_squares(frontier):
+            distances[square] = distance
+            reach |= masks[square]
+        frontier = reach & free & ~seen
+        seen |= frontier
+        distance += 1
+    return distances
+
+
+class DistanceField:
+    """Fewest moves between every pair of squares for one movement pattern."""
+
+    def __init__(self, masks, free):
+        self.masks = masks
+        self.free = free
+        self.table = b''.join(bfs(1 << square, masks, free) for square in range(NUM_SQUARES))
+
+    def distance(self, from_square, to_square):
+        """Fewest moves from from_square to to_square, or UNREACHABLE."""
+        return self.table[from_square * NUM_SQUARES + to_square]
+
+    def distances_from(self, square):
+        """Fewest moves from square to each square, as a memoryview of NUM_SQUARES bytes."""
+        return memoryview(self.table)[square * NUM_SQUARES:(square + 1) * NUM_SQUARES]
+
+
+class DistanceMaps:
+    """Distance fields of every unit type over one terrain map.
+
+    Unit types that share a movement pattern share their fields. blocked
+    is a mask of squares no move may end on, such as the towers; pass
+    occupied squares to field() for the current position.
+    """
+
+    def __init__(self, terrain, blocked=0, cache_size=8):
+        self.terrain = bytes(terrain)
+        self.water = terrain_mask(terrain, BLUE)
+        self.blocked = blocked
+        self.not_red = ALL_SQUARES & ~terrain_mask(terrain, RED)
+        self.cache_size = cache_size
+        self.fields = OrderedDict()  # (id of the masks, occupied) -> DistanceField, oldest first
+
+    def field(self, kind, occupied=0):
+        """Return the DistanceField of unit type kind with the occupied squares blocked too."""
+        masks = MOVE_MASKS[kind]
+        key = (id(masks), occupied)
+        field = self.fields.get(key)
+        if field is None:
+            field = DistanceField(masks, ALL_SQUARES & ~(self.water | self.blocked | occupied))
+            self.fields[key] = field
+            if len(self.fields) > self.cache_size:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(key)
+        return field
+
+    def distance(self, kind, from_square, to_square, occupied=0):
+        return self.field(kind, occupied).distance(from_square, to_square)
+
+    def to_attack(self, kind, target, occupied=0):
+        """Fewest moves from each square until a unit of type kind has target in attack range, as a bytearray."""
+        return self._to_spots(kind, self._spots(kind, target, ALL_SQUARES), occupied)
+
+    def to_tower(self, kind, tower_square, occupied=0):
+        """Like to_attack, but leaves out red squares, since towers cannot be hit from red terrain."""
+        return self._to_spots(kind, self._spots(kind, tower_square, self.not_red), occupied)
+
+    @staticmethod
+    def _spots(kind, target, allowed):
+        """Mask of the squares in allowed from which a unit of type kind can attack target."""
+        attack_masks = ATTACK_MASKS[kind]
+        spots = 0
+        for square in iter_squares(allowed):
+            if attack_masks[square] >> target & 1:
+                spots |= 1 << square
+        return spots
+
+    def _to_spots(self, kind, spots, occupied):
+        """Fewest moves from each square to the nearest square in spots.
+
+        One BFS backwards from the spots, which works because every movement
+        pattern is symmetric. Squares that are not free still get a distance,
+        since a unit may start there, but no path goes through them.
+        """
+        masks = MOVE_MASKS[kind]
+        free = ALL_SQUARES & ~(self.water | self.blocked | occupied)
+        distances = bytearray([UNREACHABLE]) * NUM_SQUARES
+        frontier = seen = spots & free
+        distance = 0
+        while frontier:
+            reach = 0
+            for square in iter_squares(frontier):
+                distances[square] = distance
+                reach |= masks[square]
+            reached = reach & ~seen
+            for square in iter_squares(reached & ~free):
+                distances[square] = distance + 1
+            seen |= reached
+            frontier = reached & free
+            distance += 1
+        for square in iter_squares(spots):
+            distances[square] = 0  # A unit already there can attack straight away
+        return distances
+
+
+@lru_cache(maxsize=64)
+def distance_maps(terrain, blocked=0):
+    """Return the shared DistanceMaps of a terrain map, given as bytes."""
+    return DistanceMaps(terrain, blocked)
@@ -0,0 +1,119 @@
+"""Typed game events published by the RulesEngine.
+
+Subscribers get one event object per thing that happened. Every event has
+a title and a message, worded like the dialogs the game used to pop up, so
+a view can log them without knowing each type. Squares are (row, col).
+"""
+from typing import NamedTuple, Optional, Tuple
+
+Square = Tuple[int, int]
+
+# Why a piece was killed
+ATTACK = 'attack'
+GRAY_TERRAIN = 'gray_terrain'  # The defender died on gray terrain and took the attacker with it
+COUNTER_ATTACK = 'counter_attack'  # A General Warrior struck back
+
+
+class Moved(NamedTuple):
+    piece: str
+    from_square: Square
+    to_square: Square
+
+    title = "Move"
+
+    @property
+    def message(self):
+        return f"{self.piece} moved."
+
+
+class Missed(NamedTuple):
+    attacker: str
+    defender: str
+    from_square: Square
+    to_square: Square
+
+    title = "Miss"
+
+    @property
+    def message(self):
+        return f"{self.attacker} missed the attack on {self.defender}!"
+
+
+class Killed(NamedTuple):
+    piece: str
+    square: Square
+    by: str
+    cause: str = ATTACK
+
+    @property
+    def title(self):
+        if self.piece.startswith('T'):
+            return "Tower Destroyed"
+        return {ATTACK: "Hit", GRAY_TERRAIN: "Gray Terrain Effect", COUNTER_ATTACK: "Counter-Attack"}[self.cause]
+
+    @property
+    def message(self):
+        if self.piece.startswith('T'):
+            return f"{self.by} destroyed {self.piece}!"
+        if self.cause == GRAY_TERRAIN:
+            return f"{self.by} was on gray terrain, and {self.piece} also dies!"
+        if self.cause == COUNTER_ATTACK:
+            return f"{self.by} counter-attacked and defeated {self.piece}!"
+        return f"{self.by} defeated {self.piece}!"
+
+
+class TowerDamaged(NamedTuple):
+    tower: str
+    square: Square
+    attacker: str
+    damage: int
+    hp: int
+
+    title = "Tower Hit"
+
+    @property
+    def message(self):
+        return f"{self.attacker} hit {self.tower}! {self.tower} has {self.hp} HP left."
+
+
+class CounterAttack(NamedTuple):
+    defender: str
+    attacker: str
+    hit: bool
+
+    @property
+    def title(self):
+        return "Counter-Attack" if self.hit else "Counter-Attack Missed"
+
+    @property
+    def message(self):
+        if self.hit:
+            return f"{self.defender} strikes back at {self.attacker}!"
+        return "The General Warrior's counter-attack missed!"
+
+
+class TurnChanged(NamedTuple):
+    player: str
+
+    title = "Turn Change"
+
+    @property
+    def message(self):
+        return f"It's now {self.player}'s turn!"
+
+
+class GameOver(NamedTuple):
+    winner: str
+    reason: Optional[str]
+
+    title = "Game Over"
+
+    @property
+    def message(self):
+        return "Player 1 wins!" if self.winner == 'P1' else "Player 2 wins!"
+
+
+class InvalidAction(NamedTuple):
+    """An action the rules refused; nothing changed."""
+    title: str
+    message: str
@@ -0,0 +1,192 @@
+"""Compact binary game records and fast replay.
+
+A record is a header followed by one 16-bit word per action:
+
+    header   MAGIC, seed (u64), tower HP (2 x u16), first player and
+             move_count (u8), terrain (2 bits per square, 16 bytes),
+             piece count (u8) then (square, piece code) byte pairs
+    actions  action count (u32), then per action the movegen action code
+             in bits 0-12 and the combat outcome in bits 13-15
+
+Storing the outcome of every attack makes replays independent of the
+random streams, so a Replay can jump to any ply by reapplying actions
+from the nearest snapshot without rendering anything.
+"""
+import struct
+import sys
+from array import array
+
+import rules_engine
+from movegen import decode, perform
+from rules_engine import BOARD_SIZE, COMBAT_OUTCOMES, UNIT_TYPES, GameState, RulesEngine
+
+MAGIC = b'CGR\x01'
+_HEADER = struct.Struct('<QHHBB')  # seed, T1 HP, T2 HP, first player, move count
+_COUNT = struct.Struct('<I')
+
+PIECE_NAMES = tuple(kind + player for kind in UNIT_TYPES + ('T',) for player in '12')  # Piece by code in records
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECE_NAMES)}
+OUTCOME_CODES = (None,) + COMBAT_OUTCOMES  # Index stored in bits 13-15; 0 for moves and tower attacks
+OUTCOME_SHIFT = 13
+ACTION_MASK = (1 << OUTCOME_SHIFT) - 1
+
+
+def pack_terrain(terrain):
+    packed = bytearray(len(terrain) // 4)
+    for square, code in enumerate(terrain):
+        packed[square >> 2] |= code << ((square & 3) * 2)
+    return bytes(packed)
+
+
+def unpack_terrain(packed):
+    return bytearray((packed[square >> 2] >> ((square & 3) * 2)) & 3 for square in range(len(packed) * 4))
+
+
+class GameRecord:
+    """The starting position of a game plus every action played and its combat outcome."""
+
+    def __init__(self, seed, terrain, placement, tower_hp, turn='P1', move_count=0):
+        self.seed = seed
+        self.terrain = bytes(terrain)
+        self.placement = placement  # [(square, piece)] at the start of the game
+        self.tower_hp = list(tower_hp)  # [T1, T2]
+        self.turn = turn
+        self.move_count = move_count
+        self.words = array('H')
+
+    @classmethod
+    def from_engine(cls, engine):
+        """Start a record from the engine's current position, normally right after place_pieces."""
+        state = engine.state
+        placement = [(square, rules_engine.PIECE_NAMES[piece]) for square, piece in enumerate(state.board) if piece]
+        return cls(engine.seed, state.terrain, placement, state.tower_hp, state.turn, state.move_count)
+
+    def __len__(self):
+        return len(self.words)
+
+    def append(self, action, outcome=None):
+        self.words.append(action | (OUTCOME_CODES.index(outcome) << OUTCOME_SHIFT))
+
+    def action(self, ply):
+        """Return (action code, outcome) of the action played at ply."""
+        word = self.words[ply]
+        return word & ACTION_MASK, OUTCOME_CODES[word >> OUTCOME_SHIFT]
+
+    def initial_state(self):
+        state = GameState()
+        state.terrain = bytearray(self.terrain)
+        state.tower_hp = list(self.tower_hp)
+        state.turn = self.turn
+        state.move_count = self.move_count
+        for square, piece in self.placement:
+            state.board[square] = rules_engine.PIECE_CODES[piece]
+        state.recount()
+        return state
+
+    def to_bytes(self):
+        header = _HEADER.pack(self.seed, *self.tower_hp, 1 if self.turn == 'P1' else 2, self.move_count)
+        pieces = bytes([len(self.placement)]) + bytes(byte for square, piece in self.placement
+                                                      for byte in (square, PIECE_CODES[piece]))
+        words = self.words
+        if sys.byteorder == 'big':  # Records are little-endian
+            words = array('H', words)
+            words.byteswap()
+        return MAGIC + header + pack_terrain(self.terrain) + pieces + _COUNT.pack(len(words)) + words.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        """Parse a record starting at offset. Returns (record, offset just past it)."""
+        if data[offset:offset + len(MAGIC)] != MAGIC:
+            raise ValueError("not a game record")
+        offset += len(MAGIC)
+        seed, t1_hp, t2_hp, first, move_count = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        terrain = unpack_terrain(data[offset:offset + BOARD_SIZE * BOARD_SIZE // 4])
+        offset += BOARD_SIZE * BOARD_SIZE // 4
+        count = data[offset]
+        placement = [(data[offset + 1 + 2 * i], PIECE_NAMES[data[offset + 2 + 2 * i]]) for i in range(count)]
+        offset += 1 + 2 * count
+        (length,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+
+        record = cls(seed, terrain, placement, (t1_hp, t2_hp), 'P1' if first == 1 else 'P2', move_count)
+        record.words.frombytes(data[offset:offset + 2 * length])
+        if sys.byteorder == 'big':
+            record.words.byteswap()
+        return record, offset + 2 * length
+
+
+class GameRecorder:
+    """Plays actions through an engine and records them with the outcome the engine rolled."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.record = GameRecord.from_engine(engine)
+        self.undo_records = []  # RulesEngine.apply() records of the recorded actions, for takeback()
+
+    def perform(self, action):
+        """Carry out and record an action code. Returns True if it was carried out."""
+        undo = self.engine.apply(action)
+        if undo is None:
+            return False
+        _, _, is_attack = decode(action)
+        self.record.append(action, self.engine.last_outcome if is_attack else None)
+        self.undo_records.append(undo)
+        return True
+
+    def takeback(self):
+        """Undo the last recorded action and drop it from the record. Returns False if there is none."""
+        if not self.undo_records:
+            return False
+        self.engine.undo(self.undo_records.pop())
+        self.record.words.pop()
+        return True
+
+
+class Replay:
+    """Random access to the positions of a recorded game.
+
+    Positions are rebuilt by reapplying recorded actions with their recorded
+    outcomes. A snapshot is kept every snapshot_every plies on the way, so
+    seeking anywhere costs at most that many actions once the game has been
+    played through.
+    """
+
+    def __init__(self, record, snapshot_every=32):
+        self.record = record
+        self.snapshot_every = snapshot_every
+        self.snapshots = [record.initial_state()]  # snapshots[i] is the position at ply i * snapshot_every
+
+    def __len__(self):
+        return len(self.record)
+
+    def state_at(self, ply):
+        """Return the position after the first ply actions."""
+        if not 0 <= ply <= len(self.record):
+            raise IndexError(ply)
+        index = min(ply // self.snapshot_every, len(self.snapshots) - 1)
+        engine = RulesEngine(self.snapshots[index].copy(), seed=self.record.seed)
+        for current in range(index * self.snapshot_every, ply):
+            action, outcome = self.record.action(current)
+            if not perform(engine, action, outcome):
+                raise ValueError(f"recorded action at ply {current} is not legal")
+            if (current + 1) % self.snapshot_every == 0 and (current + 1) // self.snapshot_every == len(self.snapshots):
+                self.snapshots.append(engine.state.copy())
+        return engine.state
+
+    def final_state(self):
+        return self.state_at(len(self.record))
+
+
+def write_records(stream, records):
+    """Write records back to back to a binary stream."""
+    for record in records:
+        stream.write(record.to_bytes())
+
+
+def read_records(data):
+    """Yield every record in bytes written by write_records."""
+    offset = 0
+    while offset < len(data):
+        record, offset = GameRecord.from_bytes(data, offset)
+        yield record
@@ -0,0 +1,325 @@
+"""Asyncio host for many concurrent games in one process.
+
+Games live in rooms keyed by a room id, each with its own RulesEngine and
+no window. Clients talk JSON, one object per line, over a local TCP
+socket or over stdin/stdout:
+
+    python game_server.py --port 8765
+    python game_server.py --stdio < commands.jsonl
+
+Client messages, by "op":
+
+    {"op": "join", "room": "r1", "player": "P1", "seed": 7}
+        Sit down as P1 or P2 (one connection may take both seats), or
+        watch with "player": null. The first join creates the room; seed
+        is optional and only used then.
+    {"op": "action", "room": "r1", "from": [1, 0], "to": [2, 0]}
+        Move or attack with the piece on "from", for the player whose turn
+        it is. Only the connection in that player's seat may act.
+    {"op": "state", "room": "r1"}
+    {"op": "leave", "room": "r1"}
+    {"op": "metrics"}
+        With --profile, the engine timings of every room so far in the
+        Prometheus text format (see instrumentation.py).
+
+Every engine event (Moved, Missed, Killed, TowerDamaged, CounterAttack,
+TurnChanged, GameOver) is pushed to everyone in the room as its fields
+plus "event", "room" and "message". Refused actions and bad requests get
+an "Error" back on the sending connection only. Once both seats are taken,
+each turn runs on a clock scheduled with loop.call_later; when it runs out
+the player loses the rest of the turn (TurnTimedOut, then TurnChanged).
+
+Run with --bench to measure the memory per room and the time per action.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+from events import InvalidAction, TurnChanged
+from instrumentation import ENGINE_METHODS, Profiler
+from rules_engine import BOARD_SIZE, PIECE_NAMES, PLAYERS, RulesEngine
+
+TURN_TIME = 60.0  # Seconds per turn; 0 turns the clock off
+
+
+class Connection:
+    """One client: where its messages go and which rooms it is in."""
+
+    __slots__ = ('write', 'flush', 'rooms')
+
+    def __init__(self, write, flush=None):
+        self.write = write
+        self.flush = flush
+        self.rooms = set()
+
+    def send(self, message):
+        self.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+
+def snapshot(state):
+    """The parts of a GameState a client needs to draw the board."""
+    return {'board': [PIECE_NAMES[piece] for piece in state.board], 'terrain': list(state.terrain),
+            'tower_hp': state.tower_hp, 'turn': state.turn, 'move_count': state.move_count,
+            'winner': state.winner, 'win_reason': state.win_reason}
+
+
+class Room:
+    """One game: its engine, who sits in each seat, who watches and the turn clock."""
+
+    __slots__ = ('id', 'engine', 'seats', 'connections', 'actor', 'turn_time', 'timer')
+
+    def __init__(self, room_id, seed=None, turn_time=TURN_TIME):
+        self.id = room_id
+        self.engine = RulesEngine(seed=seed)
+        self.engine.generate_terrain()
+        self.engine.place_pieces()
+        self.engine.subscribe(self.on_event)
+        self.seats = {}  # Player -> Connection
+        self.connections = set()  # Seated players and watchers
+        self.actor = None  # Connection whose action is being carried out
+        self.turn_time = turn_time
+        self.timer = None  # Starts once both seats are taken
+
+    def broadcast(self, message):
+        for connection in self.connections:
+            connection.send(message)
+
+    def on_event(self, event):
+        message = {'event': type(event).__name__, 'room': self.id, **event._asdict(), 'message': event.message}
+        if isinstance(event, InvalidAction):
+            message['event'] = 'Error'
+            if self.actor is not None:
+                self.actor.send(message)
+                self.actor = None  # The engine gave its own reason, so act() adds none
+            return
+        self.broadcast(message)
+        if isinstance(event, TurnChanged):
+            self.start_clock()
+
+    def start_clock(self):
+        self.stop_clock()
+        if self.turn_time and not self.engine.state.winner:
+            self.timer = asyncio.get_running_loop().call_later(self.turn_time, self.on_timeout)
+
+    def stop_clock(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def on_timeout(self):
+        self.timer = None
+        self.broadcast({'event': 'TurnTimedOut', 'room': self.id, 'player': self.engine.state.turn,
+                        'message': f"{self.engine.state.turn} ran out of time."})
+        self.engine.pass_turn()
+
+    def act(self, connection, from_square, to_square):
+        """Carry out an action for the connection. Returns an error message to send back, or None."""
+        state = self.engine.state
+        if state.winner:
+            return "The game is over."
+        if self.seats.get(state.turn) is not connection:
+            return f"It's {state.turn}'s turn."
+        self.actor = connection
+        try:
+            done = self.engine.move_or_attack(*from_square, *to_square)
+            reported = self.actor is None
+        finally:
+            self.actor = None
+        if not done:
+            return None if reported else "Invalid action."
+        if state.winner:
+            self.stop_clock()
+        return None
+
+    def close(self):
+        self.stop_clock()
+        self.engine.unsubscribe(self.on_event)
+
+
+def _square(value):
+    """Parse a [row, col] pair from a message, or return None."""
+    if (isinstance(value, list) and len(value) == 2 and all(type(x) is int for x in value)
+            and all(0 <= x < BOARD_SIZE for x in value)):
+        return value
+    return None
+
+
+class GameServer:
+    """All rooms of the process, and the protocol that drives them."""
+
+    def __init__(self, turn_time=TURN_TIME, profiler=None):
+        self.turn_time = turn_time
+        self.profiler = profiler
+        self.rooms = {}  # Room id -> Room
+
+    def handle(self, connection, message):
+        """Act on one client message."""
+        if isinstance(message, dict) and message.get('op') == 'metrics':
+            if self.profiler is None:
+                connection.send({'event': 'Error', 'message': "Profiling is off; start the server with --profile."})
+            else:
+                connection.send({'event': 'Metrics', 'text': self.profiler.export()})
+            return
+        room_id = message.get('room') if isinstance(message, dict) else None
+        if not isinstance(room_id, str):
+            connection.send({'event': 'Error', 'message': "Expected an object with a room id."})
+            return
+        op = message.get('op')
+        room = self.rooms.get(room_id)
+        if op == 'join':
+            self.join(connection, room_id, message.get('player'), message.get('seed'))
+        elif room is None:
+            connection.send({'event': 'Error', 'room': room_id, 'message': "No such room."})
+        elif op == 'action':
+            from_square, to_square = _square(message.get('from')), _square(message.get('to'))
+            if from_square is None or to_square is None:
+                error = "Expected 'from' and 'to' as [row, col]."
+            else:
+                error = room.act(connection, from_square, to_square)
+            if error:
+                connection.send({'event': 'Error', 'room': room_id, 'message': error})
+        elif op == 'state':
+            connection.send({'event': 'State', 'room': room_id, **snapshot(room.engine.state)})
+        elif op == 'leave':
+            self.leave(connection, room)
+        else:
+            connection.send({'event': 'Error', 'room': room_id, 'message': f"Unknown op {op!r}."})
+
+    def join(self, connection, room_id, player, seed=None):
+        if player is not None and player not in PLAYERS:
+            connection.send({'event': 'Error', 'room': room_id, 'message': "player must be P1, P2 or null."})
+            return
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = Room(room_id, seed if type(seed) is int else None, self.turn_time)
+            if self.profiler is not None:
+                self.profiler.instrument(room.engine, ENGINE_METHODS)
+        if player is not None:
+            seated = room.seats.get(player)
+            if seated is not None and seated is not connection:
+                connection.send({'event': 'Error', 'room': room_id, 'message': f"{player}'s seat is taken."})
+                return
+            room.seats[player] = connection
+            if len(room.seats) == len(PLAYERS) and room.timer is None:
+                room.start_clock()
+        room.connections.add(connection)
+        connection.rooms.add(room_id)
+        connection.send({'event': 'Joined', 'room': room_id, 'player': player, 'seed': room.engine.seed,
+                         **snapshot(room.engine.state)})
+
+    def leave(self, connection, room):
+        """Take the connection out of the room, and drop the room once nobody is left in it."""
+        room.connections.discard(connection)
+        connection.rooms.discard(room.id)
+        for player, seated in list(room.seats.items()):
+            if seated is connection:
+                del room.seats[player]
+        if not room.connections:
+            room.close()
+            if self.profiler is not None:
+                self.profiler.uninstrument(room.engine)
+            del self.rooms[room.id]
+
+    def disconnect(self, connection):
+        for room_id in list(connection.rooms):
+            self.leave(connection, self.rooms[room_id])
+
+    async def serve_lines(self, reader, connection):
+        """Handle JSON lines from reader until it closes."""
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    connection.send({'event': 'Error', 'message': "Not valid JSON."})
+                else:
+                    self.handle(connection, message)
+                if connection.flush is not None:
+                    await connection.flush()
+        finally:
+            self.disconnect(connection)
+
+    async def serve_tcp(self, host, port):
+        async def on_client(reader, writer):
+            try:
+                await self.serve_lines(reader, Connection(writer.write, writer.drain))
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(on_client, host, port)
+        print(f"Serving games on {host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+        """Serve a single connection over stdin and stdout, which must be pipes or a terminal."""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        out = sys.stdout.buffer
+
+        async def flush():
+            out.flush()
+
+        await self.serve_lines(reader, Connection(out.write, flush))
+
+
+async def _bench(rooms, actions):
+    """Print the memory per room and the time per action of the GameServer."""
+    import time
+    import tracemalloc
+
+    from movegen import decode, legal_actions
+
+    server = GameServer()
+    connection = Connection(lambda data: None)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for index in range(rooms):
+        server.handle(connection, {'op': 'join', 'room': f'room-{index}', 'player': 'P1', 'seed': index})
+        server.handle(connection, {'op': 'join', 'room': f'room-{index}', 'player': 'P2'})
+    per_room = (tracemalloc.get_traced_memory()[0] - before) / rooms
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    messages = []
+    elapsed = 0.0
+    for _ in range(actions):
+        room = server.rooms[f'room-{rng.randrange(rooms)}']
+        choices = legal_actions(room.engine.state, room.engine.state.turn)
+        if not choices:
+            continue
+        from_square, to_square, _ = decode(rng.choice(choices))
+        message = {'op': 'action', 'room': room.id, 'from': list(divmod(from_square, BOARD_SIZE)),
+                   'to': list(divmod(to_square, BOARD_SIZE))}
+        messages.append(message)
+        start = time.perf_counter()
+        server.handle(connection, message)
+        elapsed += time.perf_counter() - start
+    print(f"{rooms} rooms, {per_room / 1024:.1f} KB per room")
+    print(f"{len(messages)} actions, {elapsed / len(messages) * 1e6:.1f} us per action")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many games over JSON lines.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--stdio', action='store_true', help="serve one client on stdin/stdout instead of TCP")
+    parser.add_argument('--turn-time', type=float, default=TURN_TIME, help="seconds per turn, 0 for no clock")
+    parser.add_argument('--profile', action='store_true', help="time the rules engine calls, see op 'metrics'")
+    parser.add_argument('--bench', type=int, metavar='ROOMS', help="measure memory and latency with ROOMS rooms")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        asyncio.run(_bench(args.bench, 20000))
+        return
+    server = GameServer(args.turn_time, Profiler() if args.profile else None)
+    asyncio.run(server.serve_stdio() if args.stdio else server.serve_tcp(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Opt-in call counters and timing histograms for the engine and the GUI.
+
+A Profiler wraps chosen methods of chosen objects, on the instance only,
+so the class and every object it was not asked to watch run the plain
+methods. With no Profiler nothing is wrapped and nothing is timed, which
+is how the game runs unless profiling is switched on (simulate.py
+--profile, game_server.py --profile or CHESS_PROFILE=1 for the window).
+
+Each watched method gets a Histogram of its inclusive run time in
+power-of-two nanosecond buckets. summary() formats a table for a person,
+export() writes the Prometheus text format for a scraper:
+
+    chess_call_seconds_bucket{method="attack_piece",le="4.096e-06"} 812
+    chess_call_seconds_sum{method="attack_piece"} 0.00291
+    chess_call_seconds_count{method="attack_piece"} 1022
+"""
+import time
+
+ENGINE_METHODS = ('is_valid_move', 'is_valid_attack', 'move_piece', 'attack_piece', 'check_game_end')
+GUI_METHODS = ('update_board', 'update_square', 'flush_redraw')
+SPRITE_METHODS = ('get', 'preload')
+
+MIN_BUCKET_BITS = 8  # The first bucket holds calls up to 2**8 ns
+BUCKETS = 20  # The last finite bucket holds calls up to 2**27 ns, about 134 ms
+METRIC = 'chess_call_seconds'
+
+
+class Histogram:
+    """Call count, total and maximum time, and counts per power-of-two bucket of nanoseconds."""
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0  # Nanoseconds
+        self.max = 0
+        self.buckets = [0] * (BUCKETS + 1)  # The extra bucket is everything slower than the last bound
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[min(max((ns - 1).bit_length() - MIN_BUCKET_BITS, 0), BUCKETS)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def quantile(self, q):
+        """Upper bound in nanoseconds of the bucket holding quantile q, or max for the overflow bucket."""
+        seen = 0
+        for index, count in enumerate(self.buckets[:BUCKETS]):
+            seen += count
+            if seen >= q * self.count:
+                return min(bucket_bound(index), self.max)
+        return self.max
+
+    def to_tuple(self):
+        """A picklable copy, for sending from a worker process; see from_tuple."""
+        return self.count, self.total, self.max, tuple(self.buckets)
+
+    @classmethod
+    def from_tuple(cls, data):
+        histogram = cls()
+        histogram.count, histogram.total, histogram.max, buckets = data
+        histogram.buckets = list(buckets)
+        return histogram
+
+
+def bucket_bound(index):
+    """Upper bound in nanoseconds of bucket index."""
+    return 1 << (index + MIN_BUCKET_BITS)
+
+
+def _timed(method, histogram):
+    clock = time.perf_counter_ns
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.add(clock() - start)
+
+    timed.__wrapped__ = method
+    return timed
+
+
+class Profiler:
+    """Times methods of the objects passed to instrument(), per method name."""
+
+    def __init__(self):
+        self.histograms = {}  # Name -> Histogram
+        self.games = 0
+        self._wrapped = []  # (object, attribute, original instance attribute or None)
+
+    def instrument(self, obj, methods, prefix=''):
+        """Wrap obj's methods so that each call is timed under prefix + method name."""
+        for method in methods:
+            name = prefix + method
+            histogram = self.histograms.setdefault(name, Histogram())
+            self._wrapped.append((obj, method, vars(obj).get(method)))
+            setattr(obj, method, _timed(getattr(obj, method), histogram))
+
+    def uninstrument(self, obj=None):
+        """Put back the plain methods of obj, or of every instrumented object."""
+        kept = []
+        for wrapped in reversed(self._wrapped):
+            target, method, original = wrapped
+            if obj is not None and target is not obj:
+                kept.append(wrapped)
+            elif original is None:
+                delattr(target, method)
+            else:
+                setattr(target, method, original)
+        self._wrapped = kept[::-1]
+
+    def reset(self):
+        """Zero every histogram, e.g. at the start of a game."""
+        for histogram in self.histograms.values():
+            histogram.__init__()
+        self.games = 0
+
+    def snapshot(self):
+        """Picklable copy of the histograms, for merge()."""
+        return {name: histogram.to_tuple() for name, histogram in self.histograms.items()}
+
+    def merge(self, snapshot, games=1):
+        """Add a snapshot() taken in another engine or process to these histograms."""
+        for name, data in snapshot.items():
+            self.histograms.setdefault(name, Histogram()).merge(Histogram.from_tuple(data))
+        self.games += games
+
+    def summary(self, title="Profile"):
+        """Return a table of calls and times per method, slowest total first."""
+        lines = [title + (f" ({self.games} games)" if self.games else ""),
+                 f"{'method':<22}{'calls':>10}{'total ms':>11}{'mean us':>10}{'p50 us':>9}{'p99 us':>9}{'max us':>10}"]
+        for name, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total):
+            if not histogram.count:
+                continue
+            lines.append(f"{name:<22}{histogram.count:>10}{histogram.total / 1e6:>11.2f}"
+                         f"{histogram.total / histogram.count / 1e3:>10.2f}{histogram.quantile(0.5) / 1e3:>9.2f}"
+                         f"{histogram.quantile(0.99) / 1e3:>9.2f}{histogram.max / 1e3:>10.2f}")
+        return '\n'.join(lines)
+
+    def export(self):
+        """Return every histogram in the Prometheus text format, one sample per line."""
+        lines = [f"# TYPE {METRIC} histogram"]
+        for name, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for index, count in enumerate(histogram.buckets[:BUCKETS]):
+                cumulative += count
+                lines.append(f'{METRIC}_bucket{{method="{name}",le="{bucket_bound(index) / 1e9:g}"}} {cumulative}')
+            lines.append(f'{METRIC}_bucket{{method="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC}_sum{{method="{name}"}} {histogram.total / 1e9:g}')
+            lines.append(f'{METRIC}_count{{method="{name}"}} {histogram.count}')
+        lines.append(f"chess_games_total {self.games}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,134 @@
+"""Legal action generation.
+
+legal_actions(state, player) lists every move and attack the player can
+make right now, packed into an array of 16-bit action codes:
+
+    bits 0-5   from square (row * BOARD_SIZE + col)
+    bits 6-11  to square
+    bit 12     ATTACK (0 for a move)
+
+Run this module to benchmark it against probing every square pair through
+the RulesEngine validators.
+"""
+from array import array
+
+from bitboards import ATTACK_MASKS, MOVE_MASKS, Bitboards, iter_squares, terrain_mask
+from rules_engine import BLUE, BOARD_SIZE, EMPTY, RED, RulesEngine, belongs_to, is_tower
+
+MOVE = 0
+ATTACK = 1 << 12
+
+
+def encode(from_square, to_square, kind=MOVE):
+    return from_square | (to_square << 6) | kind
+
+
+def decode(action):
+    """Return (from_square, to_square, is_attack) for an action code."""
+    return action & 63, (action >> 6) & 63, bool(action & ATTACK)
+
+
+def legal_actions(state, player, bitboards=None):
+    """Return every legal move and attack for player as an array('H') of action codes.
+
+    A player only has actions on their own turn while it still has actions
+    left (2 per turn). Moves cannot end on water or on another piece, towers
+    neither move nor attack, and a tower cannot be attacked from red terrain.
+    Pass bitboards to reuse masks that are already in sync with state.
+    """
+    actions = array('H')
+    if state.winner or state.turn != player or state.move_count >= 2:
+        return actions
+
+    if bitboards is None:
+        bitboards = Bitboards.from_state(state)
+    enemy = 'P2' if player == 'P1' else 'P1'
+    enemies = bitboards.occupied[enemy]
+    free = bitboards.empty & ~bitboards.water
+    enemy_tower = bitboards.pieces.get(('T', enemy), 0)
+    red = terrain_mask(state.terrain, RED)
+
+    for (kind, owner), mask in bitboards.pieces.items():
+        if owner != player:
+            continue
+        moves = MOVE_MASKS[kind]
+        attacks = ATTACK_MASKS[kind]
+        for square in iter_squares(mask):
+            for target in iter_squares(moves[square] & free):
+                actions.append(square | (target << 6))
+            targets = attacks[square] & enemies
+            if red >> square & 1:
+                targets &= ~enemy_tower  # Towers cannot be hit from red terrain
+            for target in iter_squares(targets):
+                actions.append(square | (target << 6) | ATTACK)
+    return actions
+
+
+def legal_actions_slow(state, player):
+    """Reference version of legal_actions that asks the RulesEngine about all 64x64 square pairs."""
+    actions = array('H')
+    if state.winner or state.turn != player or state.move_count >= 2:
+        return actions
+
+    engine = RulesEngine(state)
+    board = state.board
+    for from_square in range(BOARD_SIZE * BOARD_SIZE):
+        selected_row, selected_col = divmod(from_square, BOARD_SIZE)
+        if not belongs_to(board[from_square], player):
+            continue
+        for to_square in range(BOARD_SIZE * BOARD_SIZE):
+            row, col = divmod(to_square, BOARD_SIZE)
+            target = board[to_square]
+            if target == EMPTY:
+                if state.terrain[to_square] != BLUE and engine.is_valid_move(selected_row, selected_col, row, col):
+                    actions.append(encode(from_square, to_square))
+            elif not belongs_to(target, player) and engine.is_valid_attack(selected_row, selected_col, row, col):
+                if not (is_tower(target) and state.terrain[from_square] == RED):
+                    actions.append(encode(from_square, to_square, ATTACK))
+    return actions
+
+
+def perform(engine, action, outcome=None):
+    """Carry out an action code through the engine. Returns True if it was carried out.
+
+    outcome forces the result of an attack, see RulesEngine.attack_piece.
+    """
+    from_square, to_square, _ = decode(action)
+    selected_row, selected_col = divmod(from_square, BOARD_SIZE)
+    row, col = divmod(to_square, BOARD_SIZE)
+    return engine.move_or_attack(selected_row, selected_col, row, col, outcome)
+
+
+def replay(seed, actions):
+    """Replay a game from its seed and action list. Returns the engine, positioned after the last action."""
+    engine = RulesEngine(seed=seed)
+    engine.generate_terrain()
+    engine.place_pieces()
+    for action in actions:
+        perform(engine, action)
+    return engine
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    rng = random.Random(0)
+    states = []
+    while len(states) < 200:
+        engine = RulesEngine(seed=len(states))
+        engine.generate_terrain()
+        engine.place_pieces()
+        for _ in range(60):
+            actions = legal_actions(engine.state, engine.state.turn)
+            if not actions:
+                break
+            states.append(engine.state.copy())
+            perform(engine, rng.choice(actions))
+
+    for state in states:
+        assert sorted(legal_actions(state, state.turn)) == sorted(legal_actions_slow(state, state.turn))
+
+    for func in (legal_actions, legal_actions_slow):
+        seconds = min(timeit.repeat(lambda: [func(s, s.turn) for s in states], number=1, repeat=5))
+        print(f"{func.__name__:20s} {len(states) / seconds:10.0f} positions/sec")
@@ -0,0 +1,567 @@
+"""Headless rules for the chess game.
+
+Nothing in this module imports tkinter or PIL, so a game can be played out
+on a server without a display. The tkinter ChessGame in chess_game.py wraps
+a RulesEngine and only draws what the engine decides.
+"""
+import random
+from typing import NamedTuple, Optional
+
+from events import (COUNTER_ATTACK, GRAY_TERRAIN, CounterAttack, GameOver, InvalidAction, Killed, Missed, Moved,
+                    TowerDamaged, TurnChanged)
+from units import UNITS
+from zobrist import PIECE_KEYS, TOWER_HP_KEYS, compute_key
+
+# Chessboard size
+BOARD_SIZE = 8
+TOWER_HP = 20  # Towers start with 20 hit points
+
+# Terrain codes, one byte per square in GameState.terrain
+GREEN, BLUE, RED, GRAY = range(4)
+TERRAIN_COLORS = ('green', 'blue', 'red', 'gray')  # Indexed by terrain code
+
+# Why a game ended
+TOWER_DESTROYED = 'tower_destroyed'
+NO_UNITS = 'no_units'  # The loser has nothing left but its tower
+
+# Results of a unit attacking another unit (attacks on towers always hit)
+MISS = 'miss'  # The defender dodged
+KILL = 'kill'  # The defender died
+MUTUAL_KILL = 'mutual_kill'  # The defender died on gray terrain and took the attacker with it
+COUNTER_MISS = 'counter_miss'  # A General Warrior dodged and its counter-attack missed
+COUNTER_KILL = 'counter_kill'  # A General Warrior dodged and its counter-attack killed the attacker
+COMBAT_OUTCOMES = (MISS, KILL, MUTUAL_KILL, COUNTER_MISS, COUNTER_KILL)
+
+# Chance of each unit type dodging an attack, unless the attacker stands on red terrain
+DODGE_CHANCE = {kind: unit.dodge for kind, unit in UNITS.items() if not unit.tower}
+COUNTER_HIT_CHANCE = 0.8  # General Warrior has an 80% chance to hit in counter-attack
+UNIT_TYPES = tuple(DODGE_CHANCE)
+
+# Piece codes, one byte per square of GameState.board: 0 for an empty square, otherwise
+# (1 + index of the type in UNITS) << 1 | owner, with owner 0 for Player 1 and 1 for Player 2
+EMPTY = 0
+PLAYERS = ('P1', 'P2')  # Indexed by owner
+OWNER = {'P1': 0, 'P2': 1}
+PIECE_TYPES = tuple(UNITS)
+PIECE_NAMES = ('', '') + tuple(kind + player for kind in PIECE_TYPES for player in '12')  # 'GW1' etc. by code
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES) if name}
+PIECE_KINDS = ('', '') + tuple(kind for kind in PIECE_TYPES for _ in PLAYERS)  # Type name by code
+TOWER_TYPE = PIECE_TYPES.index('T') + 1  # code >> 1 of both towers
+
+# Movement and attack patterns from the unit registry, as one byte per offset between two squares
+OFFSET_WIDTH = 2 * BOARD_SIZE - 1
+
+
+def _offset(selected_row, selected_col, row, col):
+    """Index of the offset from (selected_row, selected_col) to (row, col) in a pattern table."""
+    return (row - selected_row + BOARD_SIZE - 1) * OFFSET_WIDTH + col - selected_col + BOARD_SIZE - 1
+
+
+def _pattern_table(pattern):
+    reach = range(1 - BOARD_SIZE, BOARD_SIZE)
+    return bytes(bool((dr or dc) and pattern(abs(dr), abs(dc))) for dr in reach for dc in reach)
+
+
+# Indexed by piece code
+MOVE_TABLES = tuple(_pattern_table(UNITS[kind].moves) if kind else b'' for kind in PIECE_KINDS)
+ATTACK_TABLES = tuple(_pattern_table(UNITS[kind].attacks) if kind else b'' for kind in PIECE_KINDS)
+TOWER_DAMAGE = tuple(UNITS[kind].tower_damage if kind else 0 for kind in PIECE_KINDS)
+
+
+def is_tower(piece):
+    return piece >> 1 == TOWER_TYPE
+
+
+def combat_probabilities(attacker, defender, attacker_terrain, defender_terrain):
+    """Return ((probability, outcome), ...) for one unit type attacking another.
+
+    Outcomes that cannot happen are left out.
+    """
+    dodge = 0.0 if attacker_terrain == RED else DODGE_CHANCE[defender]
+    hit = MUTUAL_KILL if defender_terrain == GRAY else KILL
+    if UNITS[defender].counter_attacks and UNITS[attacker].provokes_counter:
+        results = ((1.0 - dodge, hit), (dodge * COUNTER_HIT_CHANCE, COUNTER_KILL),
+                   (dodge * (1.0 - COUNTER_HIT_CHANCE), COUNTER_MISS))
+    else:
+        results = ((1.0 - dodge, hit), (dodge, MISS))
+    return tuple((probability, outcome) for probability, outcome in results if probability > 0.0)
+
+
+def _build_combat_table():
+    table = {}
+    for attacker in UNIT_TYPES:
+        for defender in UNIT_TYPES:
+            for attacker_terrain in range(len(TERRAIN_COLORS)):
+                for defender_terrain in range(len(TERRAIN_COLORS)):
+                    key = (attacker, defender, attacker_terrain, defender_terrain)
+                    table[key] = combat_probabilities(*key)
+    return table
+
+
+# (attacker type, defender type, attacker terrain, defender terrain) -> ((probability, outcome), ...)
+COMBAT_TABLE = _build_combat_table()
+
+
+def _cumulative(results):
+    total = 0.0
+    cumulative = []
+    for probability, outcome in results:
+        total += probability
+        cumulative.append((total, outcome))
+    return tuple(cumulative)
+
+
+# Same keys, with running totals of the probabilities for sampling
+CUMULATIVE_COMBAT_TABLE = {key: _cumulative(results) for key, results in COMBAT_TABLE.items()}
+
+
+def rebuild_combat_tables():
+    """Recompute the combat tables in place after DODGE_CHANCE or COUNTER_HIT_CHANCE changed."""
+    COMBAT_TABLE.update(_build_combat_table())
+    CUMULATIVE_COMBAT_TABLE.update({key: _cumulative(results) for key, results in COMBAT_TABLE.items()})
+
+
+class GameState:
+    """Board, terrain, tower hit points and turn bookkeeping for one game.
+
+    board holds one piece code per square (see PIECE_CODES), square =
+    row * BOARD_SIZE + col, like terrain. tower_hp, unit_counts and
+    tower_alive are indexed by owner: 0 for Player 1 and T1, 1 for Player 2
+    and T2.
+
+    unit_counts and tower_alive summarise the board for the win check, and
+    key is the Zobrist key of the board, terrain and tower hit points (see
+    zobrist.py). The RulesEngine keeps all three up to date as pieces move
+    and die. Call recount() after setting up a position by hand.
+    """
+
+    __slots__ = ('board', 'terrain', 'tower_hp', 'turn', 'move_count', 'winner', 'win_reason', 'unit_counts',
+                 'tower_alive', 'key')
+
+    def __init__(self):
+        self.board = bytearray(BOARD_SIZE * BOARD_SIZE)  # Piece code per square, EMPTY if none
+        self.terrain = bytearray(BOARD_SIZE * BOARD_SIZE)  # Terrain code per square
+        self.tower_hp = [TOWER_HP, TOWER_HP]
+        self.turn = 'P1'  # Tracks whose turn it is, P1 for Player 1 and P2 for Player 2
+        self.move_count = 0  # Track how many moves have been made during the current turn
+        self.winner = None  # 'P1' or 'P2' once the game is over
+        self.win_reason = None  # TOWER_DESTROYED or NO_UNITS once the game is over
+        self.unit_counts = [0, 0]  # Pieces other than the tower each player has left
+        self.tower_alive = [False, False]
+        self.key = 0
+
+    def recount(self):
+        """Recompute unit_counts, tower_alive and key from the board."""
+        self.unit_counts = [0, 0]
+        self.tower_alive = [False, False]
+        for piece in self.board:
+            if is_tower(piece):
+                self.tower_alive[piece & 1] = True
+            elif piece:
+                self.unit_counts[piece & 1] += 1
+        self.key = compute_key(self)
+
+    def copy(self):
+        """Return an independent copy of this state."""
+        state = GameState.__new__(GameState)
+        state.board = self.board[:]
+        state.terrain = self.terrain  # Terrain never changes during a game, so it is shared
+        state.tower_hp = self.tower_hp[:]
+        state.turn = self.turn
+        state.move_count = self.move_count
+        state.winner = self.winner
+        state.win_reason = self.win_reason
+        state.unit_counts = self.unit_counts[:]
+        state.tower_alive = self.tower_alive[:]
+        state.key = self.key
+        return state
+
+    def piece_at(self, row, col):
+        """Return the piece code on (row, col)."""
+        return self.board[row * BOARD_SIZE + col]
+
+    def terrain_at(self, row, col):
+        """Return the terrain code of (row, col)."""
+        return self.terrain[row * BOARD_SIZE + col]
+
+
+class Undo(NamedTuple):
+    """Everything RulesEngine.apply() may change, as it was before the action."""
+    action: int
+    from_piece: int
+    to_piece: int
+    t1_hp: int
+    t2_hp: int
+    p1_units: int
+    p2_units: int
+    t1_alive: bool
+    t2_alive: bool
+    turn: str
+    move_count: int
+    winner: Optional[str]
+    win_reason: Optional[str]
+    key: int
+
+
+def belongs_to(piece, player):
+    """Check if the piece code belongs to player ('P1' or 'P2')."""
+    return piece != EMPTY and piece & 1 == OWNER[player]
+
+
+class RulesEngine:
+    """Applies the game rules to a GameState.
+
+    Everything that happens is published as an event from events.py to the
+    callbacks registered with subscribe(). With no subscribers the events
+    are never even built, so headless games pay nothing for them.
+
+    Each engine owns two random streams derived from seed: terrain_rng to
+    pick a map in generate_terrain and combat_rng for attack results. A game is therefore
+    reproduced exactly by its seed and its list of actions, and engines
+    never share random state. Without a seed, a fresh one is drawn and kept
+    in self.seed.
+
+    With track_changes=True the engine also remembers which squares each
+    action touched (moved pieces, dead pieces, damaged towers) until
+    take_changed_squares() collects them, so a view can redraw only those.
+    """
+
+    def __init__(self, state=None, seed=None, track_changes=False):
+        self.state = state if state is not None else GameState()
+        self.subscribers = []
+        self.last_outcome = None  # Result of the last unit-on-unit attack, for recording games
+        self.changed_squares = set() if track_changes else None
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self.terrain_rng = random.Random(f'{seed}/terrain')
+        self.combat_rng = random.Random(f'{seed}/combat')
+
+        self.max_blue_squares = 6  # Maximum number of blue squares allowed
+        self.max_red_squares = 2   # Maximum number of red squares allowed
+        self.max_gray_squares = 1  # Maximum number of gray squares allowed
+
+    def generate_terrain(self):
+        """Give the board a fair terrain map from the pool for the engine's square limits."""
+        from terrain import terrain_pool  # terrain imports this module
+        pool = terrain_pool(self.max_blue_squares, self.max_red_squares, self.max_gray_squares)
+        self.state.terrain[:] = pool.draw(self.terrain_rng)
+        self.state.key = compute_key(self.state)
+
+    def place_pieces(self):
+        """Put both armies in their starting squares."""
+        board = self.state.board
+
+        def put(row, col, piece):
+            board[row * BOARD_SIZE + col] = PIECE_CODES[piece]
+
+        # Place 2 Horse units for each side
+        put(0, 2, 'H1')  # Player 1's Horse
+        put(7, 5, 'H2')  # Player 2's Horse
+
+        put(1, 0, 'A1')  # Player 1's right-side Archer
+        put(1, 7, 'H1')  # Player 1's right-side Horse
+        put(6, 0, 'H2')  # Player 2's right-side Horse
+        put(6, 7, 'A2')  # Player 2's right-side Archer
+        put(7, 7, 'GR2')  # Player 2's General Horse
+        put(0, 0, 'GR1')  # Player 1's General Horse
+        # Place 1 Archer for each side on the right side
+        put(0, 4, 'A1')  # Player 1's Archer
+        put(7, 3, 'A2')  # Player 2's Archer
+
+        # Place 1 General Warrior for Player 1 and General Hunter for Player 2
+        put(0, 3, 'GW1')  # Player 1's General Warrior
+        put(7, 4, 'GH2')  # Player 2's General Hunter
+
+        # Place Tower for both players (Player 1 on the left side of row 3, Player 2 on the right side of row 4)
+        put(3, 0, 'T1')  # Player 1's Tower
+        put(4, 7, 'T2')  # Player 2's Tower
+
+        self.state.recount()
+
+    def can_select(self, row, col):
+        """Check if the piece on (row, col) belongs to the player whose turn it is."""
+        return belongs_to(self.state.board[row * BOARD_SIZE + col], self.state.turn)
+
+    def move_or_attack(self, selected_row, selected_col, row, col, outcome=None):
+        """Move or attack with the current player's piece, depending on the target square.
+
+        Returns True if the action was carried out. outcome is passed on to
+        attack_piece.
+        """
+        state = self.state
+        self.last_outcome = None
+        if state.winner or not self.can_select(selected_row, selected_col):
+            return False
+
+        # Determine if the action is a move or an attack
+        target_piece = state.board[row * BOARD_SIZE + col]
+        if target_piece == EMPTY:  # If the target square is empty, it's a move
+            return self.move_piece(selected_row, selected_col, row, col)
+        if belongs_to(target_piece, state.turn):
+            return False
+        if is_tower(state.board[selected_row * BOARD_SIZE + selected_col]):
+            if self.subscribers:
+                self.publish(InvalidAction("Invalid Attack", "Towers cannot attack!"))
+            return False
+        if self.is_valid_attack(selected_row, selected_col, row, col):
+            return self.attack_piece(selected_row, selected_col, row, col, outcome)
+        return False
+
+    def apply(self, action, outcome=None):
+        """Carry out a movegen action code and return an Undo record for it, or None if it was refused.
+
+        An action only ever changes its from and to squares, so the record
+        holds those two squares plus the tower, counter and turn fields.
+        outcome is passed on to attack_piece. Events are published as usual.
+        """
+        state = self.state
+        from_square, to_square = action & 63, action >> 6 & 63
+        board, tower_hp, unit_counts, tower_alive = state.board, state.tower_hp, state.unit_counts, state.tower_alive
+        record = Undo(action, board[from_square], board[to_square], tower_hp[0], tower_hp[1], unit_counts[0],
+                      unit_counts[1], tower_alive[0], tower_alive[1], state.turn, state.move_count, state.winner,
+                      state.win_reason, state.key)
+        selected_row, selected_col = divmod(from_square, BOARD_SIZE)
+        row, col = divmod(to_square, BOARD_SIZE)
+        if not self.move_or_attack(selected_row, selected_col, row, col, outcome):
+            return None
+        return record
+
+    def undo(self, record):
+        """Put the state back to how it was before the action of an Undo record from apply().
+
+        Records must be undone last first. Nothing is published, and the
+        combat random stream is not rewound, so an attack played again may
+        turn out differently.
+        """
+        state = self.state
+        from_square, to_square = record.action & 63, record.action >> 6 & 63
+        state.board[from_square] = record.from_piece
+        state.board[to_square] = record.to_piece
+        state.tower_hp[0], state.tower_hp[1] = record.t1_hp, record.t2_hp
+        state.unit_counts[0], state.unit_counts[1] = record.p1_units, record.p2_units
+        state.tower_alive[0], state.tower_alive[1] = record.t1_alive, record.t2_alive
+        state.turn = record.turn
+        state.move_count = record.move_count
+        state.winner = record.winner
+        state.win_reason = record.win_reason
+        state.key = record.key
+        self.last_outcome = None
+        if self.changed_squares is not None:
+            self.changed_squares.update((divmod(from_square, BOARD_SIZE), divmod(to_square, BOARD_SIZE)))
+
+    def move_piece(self, selected_row, selected_col, row, col):
+        """Move a piece to an empty square. Returns True if the move was made."""
+        state = self.state
+        from_square = selected_row * BOARD_SIZE + selected_col
+        to_square = row * BOARD_SIZE + col
+        piece = state.board[from_square]
+
+        if not piece:
+            return False  # Ensure the piece exists before moving
+
+        # Prevent movement onto blue squares (water)
+        if state.terrain[to_square] == BLUE:
+            if self.subscribers:
+                self.publish(InvalidAction("Invalid Move", "You cannot move onto water (blue square)!"))
+            return False
+
+        if not self.is_valid_move(selected_row, selected_col, row, col):
+            return False
+
+        state.board[to_square] = piece
+        state.board[from_square] = EMPTY
+        keys = PIECE_KEYS[piece]
+        state.key ^= keys[from_square] ^ keys[to_square]
+        if self.changed_squares is not None:
+            self.changed_squares.update(((selected_row, selected_col), (row, col)))
+        if self.subscribers:
+            self.publish(Moved(PIECE_NAMES[piece], (selected_row, selected_col), (row, col)))
+        state.move_count += 1
+        self.end_turn_if_done()
+        return True
+
+    def is_valid_move(self, selected_row, selected_col, row, col):
+        """Check if the piece on the selected square can move to (row, col), ignoring terrain."""
+        piece = self.state.board[selected_row * BOARD_SIZE + selected_col]
+        return bool(piece) and bool(MOVE_TABLES[piece][_offset(selected_row, selected_col, row, col)])
+
+    def is_valid_attack(self, selected_row, selected_col, row, col):
+        """Check if the piece on the selected square has (row, col) in attack range."""
+        piece = self.state.board[selected_row * BOARD_SIZE + selected_col]
+        return bool(piece) and bool(ATTACK_TABLES[piece][_offset(selected_row, selected_col, row, col)])
+
+    def attack_piece(self, selected_row, selected_col, row, col, outcome=None):
+        """Handle the attack action. Returns True if an action was used up.
+
+        outcome forces the result of a unit-on-unit attack (one of the
+        COMBAT_OUTCOMES); by default it is rolled from COMBAT_TABLE.
+        """
+        state = self.state
+        from_square = selected_row * BOARD_SIZE + selected_col
+        to_square = row * BOARD_SIZE + col
+        attacker_piece = state.board[from_square]
+        defender_piece = state.board[to_square]
+
+        if not attacker_piece or not defender_piece:
+            return False  # Exit if either the attacker or defender doesn't exist
+
+        # Towers cannot be hit from red terrain
+        if is_tower(defender_piece) and state.terrain[from_square] == RED:
+            if self.subscribers:
+                self.publish(InvalidAction("Invalid Attack", "You cannot attack a tower from red terrain!"))
+            return False
+
+        # Towers cannot initiate an attack and should not be able to counter-attack
+        if is_tower(defender_piece):  # Check if it's a tower
+            tower_id = defender_piece & 1  # 0 for Player 1's tower, 1 for Player 2's tower
+
+            damage = TOWER_DAMAGE[attacker_piece]
+
+            # Apply the damage to the tower
+            hp_keys = TOWER_HP_KEYS[tower_id]
+            state.key ^= hp_keys[state.tower_hp[tower_id]]
+            state.tower_hp[tower_id] -= damage
+            state.key ^= hp_keys[state.tower_hp[tower_id]]
+            if self.changed_squares is not None:
+                self.changed_squares.add((row, col))
+            if self.subscribers:
+                self.publish(TowerDamaged(PIECE_NAMES[defender_piece], (row, col), PIECE_NAMES[attacker_piece], damage,
+                                          state.tower_hp[tower_id]))
+
+            if state.tower_hp[tower_id] <= 0:
+                # Tower is destroyed
+                self.remove_piece(row, col)  # Remove the tower from the board
+                if self.subscribers:
+                    self.publish(Killed(PIECE_NAMES[defender_piece], (row, col), PIECE_NAMES[attacker_piece]))
+
+            # Attacking the tower consumes both actions
+            state.move_count = 2
+            self.end_turn_if_done()
+            self.check_game_end()
+            return True
+
+        if outcome is None:
+            key = (PIECE_KINDS[attacker_piece], PIECE_KINDS[defender_piece], state.terrain[from_square],
+                   state.terrain[to_square])
+            outcome = self.roll_outcome(key)
+        self.last_outcome = outcome
+
+        if self.subscribers:
+            attacker_name, defender_name = PIECE_NAMES[attacker_piece], PIECE_NAMES[defender_piece]
+
+        if outcome in (MISS, COUNTER_MISS, COUNTER_KILL):
+            if self.subscribers:
+                self.publish(Missed(attacker_name, defender_name, (selected_row, selected_col), (row, col)))
+            if outcome == COUNTER_KILL:
+                self.remove_piece(selected_row, selected_col)  # Eliminate the attacker
+                if self.subscribers:
+                    self.publish(CounterAttack(defender_name, attacker_name, True))
+                    self.publish(Killed(attacker_name, (selected_row, selected_col), defender_name, COUNTER_ATTACK))
+            elif outcome == COUNTER_MISS:
+                if self.subscribers:
+                    self.publish(CounterAttack(defender_name, attacker_name, False))
+            if outcome != MISS:
+                state.move_count += 1  # Count the counter-attack as a move
+            state.move_count += 1  # Even if it misses, it counts as a move
+            self.end_turn_if_done()
+            if outcome == COUNTER_KILL:
+                self.check_game_end()
+            return True
+
+        # Gray terrain under the defender takes the attacker down with it
+        if outcome == MUTUAL_KILL:
+            self.remove_piece(selected_row, selected_col)  # Attacker also dies
+            if self.subscribers:
+                self.publish(Killed(attacker_name, (selected_row, selected_col), defender_name, GRAY_TERRAIN))
+
+        # If the attack hits, remove the defender
+        self.remove_piece(row, col)  # Defender is defeated
+        if self.subscribers:
+            self.publish(Killed(defender_name, (row, col), attacker_name))
+
+        # The attacker does not move, it stays in the original position
+        state.move_count += 1
+
+        # End the turn if both moves are used
+        self.end_turn_if_done()
+
+        # Check if game has ended (if a tower or all other units are killed)
+        self.check_game_end()
+        return True
+
+    def roll_outcome(self, key):
+        """Draw the result of a unit-on-unit attack from COMBAT_TABLE."""
+        roll = self.combat_rng.random()
+        for threshold, outcome in CUMULATIVE_COMBAT_TABLE[key]:
+            if roll < threshold:
+                return outcome
+        return outcome  # Guards against rounding in the last threshold
+
+    def remove_piece(self, row, col):
+        """Take a dead piece or destroyed tower off the board and update the win-check counters."""
+        state = self.state
+        square = row * BOARD_SIZE + col
+        piece = state.board[square]
+        state.board[square] = EMPTY
+        state.key ^= PIECE_KEYS[piece][square]
+        if self.changed_squares is not None:
+            self.changed_squares.add((row, col))
+        if is_tower(piece):
+            state.tower_alive[piece & 1] = False
+        else:
+            state.unit_counts[piece & 1] -= 1
+
+    def subscribe(self, callback):
+        """Call callback(event) for every event the engine publishes from now on."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def publish(self, event):
+        for callback in self.subscribers:
+            callback(event)
+
+    def take_changed_squares(self):
+        """Return the (row, col) squares changed since the last call and start a new set."""
+        if self.changed_squares is None:
+            return set()  # Not tracking changes
+        changed, self.changed_squares = self.changed_squares, set()
+        return changed
+
+    def check_game_end(self):
+        """Check if the game has ended, from the counters kept by remove_piece."""
+        state = self.state
+        p1_tower_exists, p2_tower_exists = state.tower_alive
+
+        # Check if any player has lost all other units (besides the tower)
+        p1_has_units = state.unit_counts[0] > 0
+        p2_has_units = state.unit_counts[1] > 0
+
+        if not p1_tower_exists or not p1_has_units:
+            self.end_game('P2', TOWER_DESTROYED if not p1_tower_exists else NO_UNITS)  # Player 2 wins
+        elif not p2_tower_exists or not p2_has_units:
+            self.end_game('P1', TOWER_DESTROYED if not p2_tower_exists else NO_UNITS)  # Player 1 wins
+
+    def end_game(self, winner, reason):
+        """Record the winner and why they won, and announce it."""
+        self.state.winner = winner
+        self.state.win_reason = reason
+        if self.subscribers:
+            self.publish(GameOver(winner, reason))
+
+    def pass_turn(self):
+        """Give up the current player's remaining actions this turn, e.g. when their turn clock runs out."""
+        if not self.state.winner:
+            self.state.move_count = 2
+            self.end_turn_if_done()
+
+    def end_turn_if_done(self):
+        """Check if both moves are used, and if so, switch turns."""
+        state = self.state
+        if state.move_count >= 2:
+            state.move_count = 0
+            state.turn = 'P2' if state.turn == 'P1' else 'P1'
+            if self.subscribers:
+                self.publish(TurnChanged(state.turn))
@@ -0,0 +1,209 @@
+"""Batch self-play simulator.
+
+Plays N headless games across a process pool and streams one fixed-size
+record per game to an output file, for example:
+
+    python simulate.py --games 100000 --p1 random --p2 greedy --out results.bin
+    python simulate.py --games 2000 --tower-hp 15 --dodge GW=0.7 --max-blue 4
+
+Game i gets the seed seed * 2**32 + i for its terrain, combat and policy
+random streams, so its result depends only on the seed and its index, not
+on which worker played it, and it can be replayed from that seed.
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from multiprocessing import Pool
+
+import rules_engine
+from ai_player import SearchPlayer
+from instrumentation import ENGINE_METHODS, Profiler
+from movegen import legal_actions, perform
+from rules_engine import NO_UNITS, TOWER_DESTROYED, TOWER_HP, GameState, RulesEngine
+
+POLICIES = ('random', 'greedy', 'search')
+MAX_ACTIONS = 2000  # Games still running after this many actions are recorded as unfinished
+
+# Output file: MAGIC, then one RECORD per game in the order games finish
+MAGIC = b'CGSIM1\n'
+RECORD = struct.Struct('<IQBBHHHH')  # index, seed, winner, reason, actions, turns, T1 damage, T2 damage
+WINNERS = (None, 'P1', 'P2')
+REASONS = (None, TOWER_DESTROYED, NO_UNITS)
+
+
+class RandomPolicy:
+    """Plays a uniformly random legal action."""
+
+    def new_game(self):
+        pass
+
+    def choose_action(self, state, rng):
+        actions = legal_actions(state, state.turn)
+        return rng.choice(actions) if actions else None
+
+
+class SearchPolicy:
+    """Plays the SearchPlayer's choice under a fixed node budget, so games stay reproducible."""
+
+    def __init__(self, max_depth, node_limit):
+        self.player = SearchPlayer(time_limit=None, node_limit=node_limit, max_depth=max_depth, workers=1)
+
+    def new_game(self):
+        self.player.new_game()  # A table left over from another game would change this one's choices
+
+    def choose_action(self, state, rng):
+        return self.player.choose_action(state)
+
+
+def make_policy(name, search_nodes):
+    if name == 'random':
+        return RandomPolicy()
+    if name == 'greedy':
+        return SearchPolicy(max_depth=1, node_limit=None)  # Best expected score after one action
+    return SearchPolicy(max_depth=6, node_limit=search_nodes)
+
+
+def game_seed(seed, index):
+    return seed * 2 ** 32 + index
+
+
+# Set up once per worker process by _init_worker
+_config = None
+_policies = None
+_profiler = None  # Only with --profile
+
+
+def _init_worker(config):
+    """Apply the rule overrides and build the policies in a worker process."""
+    global _config, _policies, _profiler
+    _config = config
+    rules_engine.DODGE_CHANCE.update(config['dodge'])
+    if config['counter_hit'] is not None:
+        rules_engine.COUNTER_HIT_CHANCE = config['counter_hit']
+    rules_engine.rebuild_combat_tables()
+    _policies = {player: make_policy(config[player], config['search_nodes']) for player in ('P1', 'P2')}
+    _profiler = Profiler() if config['profile'] else None
+
+
+def play_game(index):
+    """Play game number index to the end and return its RECORD fields."""
+    seed = game_seed(_config['seed'], index)
+    rng = random.Random(f'{seed}/policy')  # The engine has its own terrain and combat streams
+
+    state = GameState()
+    state.tower_hp = [_config['tower_hp'], _config['tower_hp']]
+    engine = RulesEngine(state, seed=seed)
+    engine.max_blue_squares = _config['max_blue']
+    engine.max_red_squares = _config['max_red']
+    engine.max_gray_squares = _config['max_gray']
+    engine.generate_terrain()
+    engine.place_pieces()
+    if _profiler is not None:
+        _profiler.instrument(engine, ENGINE_METHODS)
+    for policy in _policies.values():
+        policy.new_game()
+
+    actions = turns = 0
+    while not state.winner and actions < _config['max_actions']:
+        turn = state.turn
+        action = _policies[turn].choose_action(state, rng)
+        if action is None:
+            break  # A side with no legal action left can't finish its turn
+        perform(engine, action)
+        actions += 1
+        if state.turn != turn:
+            turns += 1
+    if _profiler is not None:
+        _profiler.uninstrument()
+
+    return (index, seed, WINNERS.index(state.winner), REASONS.index(state.win_reason), actions, turns,
+            _config['tower_hp'] - state.tower_hp[0], _config['tower_hp'] - state.tower_hp[1])
+
+
+def play_profiled_game(index):
+    """Play a game like play_game and return (its RECORD fields, a snapshot of its engine timings)."""
+    _profiler.reset()
+    record = play_game(index)
+    return record, _profiler.snapshot()
+
+
+def read_results(path):
+    """Yield the records of a simulator output file as dicts."""
+    with open(path, 'rb') as results:
+        if results.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a simulator output file")
+        while True:
+            data = results.read(RECORD.size)
+            if len(data) < RECORD.size:
+                return
+            index, seed, winner, reason, actions, turns, t1_damage, t2_damage = RECORD.unpack(data)
+            yield {'index': index, 'seed': seed, 'winner': WINNERS[winner], 'reason': REASONS[reason],
+                   'actions': actions, 'turns': turns, 'T1_damage': t1_damage, 'T2_damage': t2_damage}
+
+
+def _dodge_override(text):
+    unit, _, chance = text.partition('=')
+    if unit not in rules_engine.DODGE_CHANCE or not chance:
+        raise argparse.ArgumentTypeError(f"expected UNIT=CHANCE with UNIT one of {', '.join(rules_engine.DODGE_CHANCE)}")
+    return unit, float(chance)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many headless games and record the results.")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--p1', choices=POLICIES, default='random')
+    parser.add_argument('--p2', choices=POLICIES, default='random')
+    parser.add_argument('--search-nodes', type=int, default=2000, help="node budget per action for 'search'")
+    parser.add_argument('--max-actions', type=int, default=MAX_ACTIONS)
+    parser.add_argument('--out', default='results.bin')
+    parser.add_argument('--tower-hp', type=int, default=TOWER_HP)
+    parser.add_argument('--max-blue', type=int, default=6)
+    parser.add_argument('--max-red', type=int, default=2)
+    parser.add_argument('--max-gray', type=int, default=1)
+    parser.add_argument('--dodge', type=_dodge_override, action='append', default=[],
+                        help="override a dodge chance, e.g. GW=0.7 (repeatable)")
+    parser.add_argument('--counter-hit', type=float, default=None, help="General Warrior counter-attack hit chance")
+    parser.add_argument('--profile', action='store_true', help="time the rules engine calls and print a summary")
+    parser.add_argument('--profile-export', metavar='PATH', help="also write the timings in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    config = {
+        'seed': args.seed, 'P1': args.p1, 'P2': args.p2, 'search_nodes': args.search_nodes,
+        'max_actions': args.max_actions, 'tower_hp': args.tower_hp, 'max_blue': args.max_blue,
+        'max_red': args.max_red, 'max_gray': args.max_gray, 'dodge': dict(args.dodge),
+        'counter_hit': args.counter_hit, 'profile': args.profile or bool(args.profile_export),
+    }
+    profiler = Profiler() if config['profile'] else None
+    wins = {'P1': 0, 'P2': 0, None: 0}
+    start = time.perf_counter()
+    workers = args.workers or os.cpu_count() or 1
+    chunksize = max(1, min(100, args.games // (4 * workers)))
+    with open(args.out, 'wb') as out, Pool(workers, _init_worker, (config,)) as pool:
+        out.write(MAGIC)
+        games = pool.imap_unordered(play_profiled_game if profiler else play_game, range(args.games), chunksize)
+        for done, record in enumerate(games, 1):
+            if profiler:
+                record, snapshot = record
+                profiler.merge(snapshot)
+            out.write(RECORD.pack(*record))
+            wins[WINNERS[record[2]]] += 1
+            if done % 1000 == 0:
+                print(f"{done}/{args.games} games, {done / (time.perf_counter() - start):.0f} games/sec", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} games in {elapsed:.1f}s ({args.games / elapsed:.1f} games/sec)")
+    print(f"P1 wins {wins['P1']}, P2 wins {wins['P2']}, unfinished {wins[None]}")
+    if profiler:
+        print(profiler.summary("Rules engine"))
+        if args.profile_export:
+            with open(args.profile_export, 'w') as export:
+                export.write(profiler.export())
+
+
+if __name__ == '__main__':
+    main()
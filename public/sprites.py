@@ -0,0 +1,54 @@
+"""Piece sprites for the tkinter GUI, decoded and scaled once.
+
+SpriteCache opens and resizes each piece image the first time it is asked
+for (or up front with preload) and hands back the same PhotoImage on every
+redraw after that. Other sizes or image sets share one LRU cache, so
+switching between a few themes doesn't decode anything twice.
+"""
+import os
+from functools import lru_cache
+
+from PIL import Image, ImageTk
+
+SPRITE_SIZE = (64, 64)
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'images')
+
+# Define piece images path
+PIECE_IMAGES = {
+    'H1': 'p1_horse.png',
+    'H2': 'horse_p2.png',
+    # Add other pieces with paths to their images
+}
+
+RESAMPLE = Image.LANCZOS  # Same filter as the old Image.ANTIALIAS, which Pillow 10 removed
+
+
+class SpriteCache:
+    """PhotoImages for pieces, keyed by image file and size.
+
+    Needs a Tk root to exist before the first get(). A sprite evicted from
+    the LRU is only freed once no widget holds a reference to it.
+    """
+
+    def __init__(self, images=None, size=SPRITE_SIZE, maxsize=64):
+        self.images = PIECE_IMAGES if images is None else images
+        self.size = size
+        self._load = lru_cache(maxsize=maxsize)(self._load_uncached)
+
+    def get(self, piece, size=None):
+        """Return the PhotoImage for piece, or None if the piece has no image."""
+        filename = self.images.get(piece)
+        if filename is None:
+            return None
+        return self._load(filename, size or self.size)
+
+    def preload(self):
+        """Decode and scale every known piece image now instead of on first use."""
+        for piece in self.images:
+            self.get(piece)
+
+    @staticmethod
+    def _load_uncached(filename, size):
+        image = Image.open(os.path.join(IMAGES_DIR, filename))
+        image = image.resize(size, RESAMPLE)
+        return ImageTk.PhotoImage(image)
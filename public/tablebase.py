@@ -0,0 +1,346 @@
+"""Endgame tablebase: solved values of positions with few units left.
+
+A tablebase covers one terrain map, every combination of up to max_units
+units per side (of the given unit types) with both towers standing on
+their starting squares, and exact tower hit points from 1 to max_hp. Each
+position, including whose turn it is and how many of the turn's two
+actions are used, gets Player 1's chance of forcing a win minus Player
+2's, each under perfect play by both sides: +1 for a certain Player 1 win,
+-1 for a certain Player 2 win, and values in between when the dice
+decide. Every action taken before the win costs a factor DISCOUNT, so a
+quicker win scores higher and a bot following the table makes progress
+instead of shuffling between won positions. A game that can be dragged on
+forever counts as no win for either side.
+
+The successors of every position are found by playing each legal action
+through RulesEngine.apply() with each combat outcome forced, so the
+tables follow attack_piece and check_game_end exactly. Material only goes
+down, so tables are solved smallest first; a kill leads into an already
+solved table. Within a table, moves can go back and forth and attacks
+have chance outcomes, so instead of a win/loss retrograde sweep each
+player's chance of winning is found by value iteration from 0 (vectorised
+with NumPy, needed only to generate). The chances only grow from sweep to
+sweep, so the iteration settles instead of swinging between the players.
+
+The file stores one int16 per position, in a fixed order, so probing a
+position is an index computation and one read from a memory map:
+
+    header   MAGIC, max units, max HP, table count (u16), terrain (64 bytes)
+    tables   per table: P1 and P2 unit counts (u8 each), offset of its
+             values (u64), then the unit type index of every unit
+    values   round(value * SCALE) per position, little-endian int16
+
+Generate a file with, for example:
+
+    python tablebase.py --seed 7 --max-units 1 --max-hp 6 --kinds P H A --out endgames.ctb
+"""
+import argparse
+import mmap
+import struct
+import sys
+import time
+from itertools import combinations_with_replacement, product
+
+from ai_player import combat_key
+from movegen import ATTACK, legal_actions
+from rules_engine import (BLUE, BOARD_SIZE, COMBAT_TABLE, OWNER, PIECE_CODES, PIECE_TYPES, PLAYERS, UNIT_TYPES,
+                          GameState, RulesEngine, is_tower)
+from terrain import TOWER_SQUARES
+
+MAGIC = b'CGTB\x01'
+_HEADER = struct.Struct('<BBH')  # max units per side, max tower HP, table count
+_TABLE = struct.Struct('<BBQ')  # P1 unit count, P2 unit count, offset of the values from the start of the file
+_VALUE = struct.Struct('<h')
+SCALE = 32767
+PHASES = 4  # OWNER[turn] * 2 + move_count
+TOWERS = tuple(row * BOARD_SIZE + col for row, col in (TOWER_SQUARES['T1'], TOWER_SQUARES['T2']))
+TOWER_CODES = (PIECE_CODES['T1'], PIECE_CODES['T2'])
+_BUILD_HP = 1000  # Tower HP while collecting successors, so no tower falls there; the real HP comes in when solving
+
+MAX_ITERATIONS = 2000
+TOLERANCE = 1e-6
+DISCOUNT = 0.999  # Per action, so that a quicker win is worth more and a won position gets played out
+
+
+def unit_codes(material):
+    """Piece codes of the units of a material ((P1 types), (P2 types)), in index order."""
+    return [PIECE_CODES[kind + player] for player, kinds in zip('12', material) for kind in kinds]
+
+
+def playable_squares(terrain):
+    """Squares a unit can stand on: everything but water and the tower squares."""
+    return [square for square in range(BOARD_SIZE * BOARD_SIZE) if terrain[square] != BLUE and square not in TOWERS]
+
+
+def materials(kinds, max_units):
+    """Every material with 1 to max_units units per side of the given types, fewest units first."""
+    kinds = sorted(kinds, key=UNIT_TYPES.index)
+    sides = [combo for count in range(1, max_units + 1) for combo in combinations_with_replacement(kinds, count)]
+    return sorted(product(sides, sides), key=lambda material: len(material[0]) + len(material[1]))
+
+
+class _Layout:
+    """Position index of one material: hit points, then phase, then the square of each unit."""
+
+    def __init__(self, material, squares, max_hp):
+        self.material = material
+        self.codes = unit_codes(material)
+        self.radix = len(squares)
+        self.configs = self.radix ** len(self.codes)
+        self.max_hp = max_hp
+        self.size = max_hp * max_hp * PHASES * self.configs
+
+    def config(self, indexes):
+        config = 0
+        for index in indexes:
+            config = config * self.radix + index
+        return config
+
+    def index(self, hp, phase, config):
+        return (((hp[0] - 1) * self.max_hp + hp[1] - 1) * PHASES + phase) * self.configs + config
+
+
+def _successors(layout, layouts, squares, engine):
+    """Collect every action of every position of layout's material, ignoring tower HP.
+
+    Returns (action_nodes, edges): the node (phase * configs + config) of
+    each action, and per outcome of each action (action, probability,
+    target material or None if the game ended, target node, T1 damage, T2
+    damage, final value).
+    """
+    state = engine.state
+    codes, k1 = layout.codes, len(layout.material[0])
+    square_index = {square: index for index, square in enumerate(squares)}
+    action_nodes, edges = [], []
+    for indexes in product(range(layout.radix), repeat=len(codes)):
+        if len(set(indexes)) < len(indexes):
+            continue  # Two units on one square
+        unit_squares = [squares[index] for index in indexes]
+        config = layout.config(indexes)
+        for code, square in zip(codes, unit_squares):
+            state.board[square] = code
+        for phase in range(PHASES):
+            state.turn, state.move_count = PLAYERS[phase >> 1], phase & 1
+            state.winner = state.win_reason = None
+            state.tower_hp = [_BUILD_HP, _BUILD_HP]
+            state.unit_counts = [k1, len(codes) - k1]
+            state.tower_alive = [True, True]
+            for action in legal_actions(state, state.turn):
+                action_id = len(action_nodes)
+                action_nodes.append(phase * layout.configs + config)
+                key = combat_key(state, action)
+                from_square, to_square = action & 63, action >> 6 & 63
+                for probability, outcome in COMBAT_TABLE[key] if key else ((1.0, None),):
+                    record = engine.apply(action, outcome)
+                    if state.winner:
+                        edges.append((action_id, probability, None, 0, 0, 0, 1.0 if state.winner == 'P1' else -1.0))
+                    else:
+                        alive = []
+                        for code, square in zip(codes, unit_squares):
+                            if square == from_square and not action & ATTACK:
+                                square = to_square
+                            if state.board[square] == code:
+                                alive.append((code, square))
+                        target = layout if len(alive) == len(codes) else layouts[(
+                            tuple(PIECE_TYPES[(code >> 1) - 1] for code, _ in alive if not code & 1),
+                            tuple(PIECE_TYPES[(code >> 1) - 1] for code, _ in alive if code & 1))]
+                        node = ((OWNER[state.turn] * 2 + state.move_count) * target.configs
+                                + target.config(square_index[square] for _, square in alive))
+                        edges.append((action_id, probability, target.material, node, _BUILD_HP - state.tower_hp[0],
+                                      _BUILD_HP - state.tower_hp[1], 0.0))
+                    engine.undo(record)
+        for square in unit_squares:
+            state.board[square] = 0
+    return action_nodes, edges
+
+
+def _solve(layout, action_nodes, edges, solved, max_iterations, tolerance):
+    """Find both players' chances of forcing a win in every position of one material.
+
+    Returns an array of shape (2, HP pairs, phases * configs): the chance
+    that Player 1 wins when Player 1 plays for the win and Player 2 against
+    it, then the same for Player 2. Each starts at 0 everywhere and only
+    grows with every sweep, so positions that can be held forever stay at 0.
+    """
+    import numpy as np
+
+    max_hp = layout.max_hp
+    values = np.zeros((2, max_hp * max_hp, PHASES * layout.configs))
+    if not action_nodes:
+        return values
+    hp1, hp2 = np.divmod(np.arange(max_hp * max_hp), max_hp)
+    hp1, hp2 = hp1 + 1, hp2 + 1
+
+    edge_action = np.array([edge[0] for edge in edges])
+    edge_probability = np.array([edge[1] for edge in edges])
+    edge_node = np.array([edge[3] for edge in edges])
+    final = np.array([edge[6] for edge in edges])
+    groups = {}  # (target material, T1 damage, T2 damage) -> edge indexes
+    for index, (_, _, target, _, damage1, damage2, _) in enumerate(edges):
+        if target is not None:
+            groups.setdefault((target, damage1, damage2), []).append(index)
+    gathers = []
+    for (target, damage1, damage2), indexes in groups.items():
+        left1, left2 = hp1 - damage1, hp2 - damage2
+        standing = (left1 > 0) & (left2 > 0)
+        row = np.where(standing, (left1 - 1) * max_hp + left2 - 1, 0)
+        fallen = np.array([left2 <= 0, left1 <= 0], dtype=float)  # A fallen tower wins the game for its attacker
+        gathers.append((target, np.array(indexes), row, standing, fallen))
+
+    action_nodes = np.array(action_nodes)
+    action_starts = np.flatnonzero(np.r_[True, np.diff(edge_action) != 0])
+    node_starts = np.flatnonzero(np.r_[True, np.diff(action_nodes) != 0])
+    nodes = action_nodes[node_starts]
+    p1_to_move = nodes // layout.configs < 2  # Phases 0 and 1 are Player 1's
+    playing = np.array([p1_to_move, ~p1_to_move])[:, None, :]  # Whether the player whose chance it is is to move
+
+    outcome_values = np.empty((2, len(hp1), len(edges)))
+    outcome_values[0], outcome_values[1] = final > 0, final < 0
+    for _ in range(max_iterations):
+        for target, indexes, row, standing, fallen in gathers:
+            source = values if target == layout.material else solved[target]
+            gathered = source[:, row[:, None], edge_node[indexes][None, :]]
+            outcome_values[:, :, indexes] = np.where(standing[:, None], gathered, fallen[:, :, None])
+        action_values = np.add.reduceat(outcome_values * (edge_probability * DISCOUNT), action_starts, axis=2)
+        best = np.where(playing, np.maximum.reduceat(action_values, node_starts, axis=2),
+                        np.minimum.reduceat(action_values, node_starts, axis=2))
+        change = (best - values[:, :, nodes]).max()
+        values[:, :, nodes] = best
+        if change < tolerance:
+            break
+    return values
+
+
+def generate(terrain, kinds=UNIT_TYPES, max_units=1, max_hp=6, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE,
+             log=None):
+    """Solve every material of a terrain map. Returns {material: win chances} as from _solve."""
+    squares = playable_squares(terrain)
+    layouts = {material: _Layout(material, squares, max_hp) for material in materials(kinds, max_units)}
+    state = GameState()
+    state.terrain[:] = terrain
+    state.board[TOWERS[0]], state.board[TOWERS[1]] = TOWER_CODES
+    engine = RulesEngine(state, seed=0)  # Every attack gets a forced outcome, so it never rolls
+    solved = {}
+    for material, layout in layouts.items():
+        start = time.perf_counter()
+        action_nodes, edges = _successors(layout, layouts, squares, engine)
+        solved[material] = _solve(layout, action_nodes, edges, solved, max_iterations, tolerance)
+        if log:
+            log(f"{'+'.join(material[0])} vs {'+'.join(material[1])}: {layout.size} positions, "
+                f"{len(edges)} outcomes, {time.perf_counter() - start:.1f}s")
+    return solved
+
+
+def write_tablebase(path, terrain, solved, max_units, max_hp):
+    """Write solved tables in the file format described at the top of this module."""
+    import numpy as np
+
+    offset = len(MAGIC) + _HEADER.size + BOARD_SIZE * BOARD_SIZE
+    offset += sum(_TABLE.size + len(material[0]) + len(material[1]) for material in solved)
+    entries, blobs = [], []
+    for material, values in solved.items():
+        blob = np.round((values[0] - values[1]) * SCALE).astype('<i2').tobytes()
+        entries.append(_TABLE.pack(len(material[0]), len(material[1]), offset)
+                       + bytes(UNIT_TYPES.index(kind) for kind in material[0] + material[1]))
+        blobs.append(blob)
+        offset += len(blob)
+    with open(path, 'wb') as out:
+        out.write(MAGIC + _HEADER.pack(max_units, max_hp, len(solved)) + bytes(terrain))
+        out.write(b''.join(entries))
+        for blob in blobs:
+            out.write(blob)
+
+
+class Tablebase:
+    """Probes a tablebase file through a memory map."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a tablebase file")
+        offset = len(MAGIC)
+        self.max_units, self.max_hp, count = _HEADER.unpack_from(self.map, offset)
+        offset += _HEADER.size
+        self.terrain = bytes(self.map[offset:offset + BOARD_SIZE * BOARD_SIZE])
+        offset += BOARD_SIZE * BOARD_SIZE
+        squares = playable_squares(self.terrain)
+        self.square_index = [None] * (BOARD_SIZE * BOARD_SIZE)
+        for index, square in enumerate(squares):
+            self.square_index[square] = index
+        self.tables = {}  # Unit codes in index order -> (layout, offset of its values)
+        for _ in range(count):
+            units1, units2, values_offset = _TABLE.unpack_from(self.map, offset)
+            offset += _TABLE.size
+            kinds = [UNIT_TYPES[index] for index in self.map[offset:offset + units1 + units2]]
+            offset += units1 + units2
+            layout = _Layout((tuple(kinds[:units1]), tuple(kinds[units1:])), squares, self.max_hp)
+            self.tables[tuple(layout.codes)] = (layout, values_offset)
+
+    def close(self):
+        self.map.close()
+
+    def probe(self, state):
+        """Player 1's expected result in state, or None if the state is not in the tablebase."""
+        if state.winner:
+            return 1.0 if state.winner == 'P1' else -1.0
+        board = state.board
+        if (state.terrain != self.terrain or board[TOWERS[0]] != TOWER_CODES[0] or board[TOWERS[1]] != TOWER_CODES[1]
+                or max(state.tower_hp) > self.max_hp):
+            return None
+        units = sorted((piece, square) for square, piece in enumerate(board) if piece and not is_tower(piece))
+        units.sort(key=lambda unit: unit[0] & 1)  # Player 1's units first, each side by type
+        entry = self.tables.get(tuple(piece for piece, _ in units))
+        if entry is None:
+            return None
+        layout, offset = entry
+        config = layout.config(self.square_index[square] for _, square in units)
+        index = layout.index(state.tower_hp, OWNER[state.turn] * 2 + state.move_count, config)
+        return _VALUE.unpack_from(self.map, offset + 2 * index)[0] / SCALE
+
+    def best_action(self, state):
+        """The action with the best expected result for the player to move, or None if the tablebase can't tell.
+
+        Looks one action ahead: every outcome of every legal action has to
+        be in the tablebase, which holds for any position that is.
+        """
+        if state.winner or self.probe(state) is None:
+            return None
+        engine = RulesEngine(state.copy(), seed=0)
+        sign = 1.0 if state.turn == 'P1' else -1.0
+        best, best_value = None, -float('inf')
+        for action in legal_actions(state, state.turn):
+            key = combat_key(engine.state, action)
+            value = 0.0
+            for probability, outcome in COMBAT_TABLE[key] if key else ((1.0, None),):
+                record = engine.apply(action, outcome)
+                result = self.probe(engine.state)
+                engine.undo(record)
+                if result is None:
+                    return None
+                value += probability * result
+            if sign * value > best_value:
+                best, best_value = action, sign * value
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase for one terrain map.")
+    parser.add_argument('--seed', type=int, default=0, help="use the terrain of the game with this seed")
+    parser.add_argument('--max-units', type=int, default=1, help="units per side")
+    parser.add_argument('--max-hp', type=int, default=6, help="highest tower HP covered")
+    parser.add_argument('--kinds', nargs='+', choices=UNIT_TYPES, default=list(UNIT_TYPES))
+    parser.add_argument('--out', default='endgames.ctb')
+    args = parser.parse_args(argv)
+
+    engine = RulesEngine(seed=args.seed)
+    engine.generate_terrain()
+    start = time.perf_counter()
+    solved = generate(engine.state.terrain, args.kinds, args.max_units, args.max_hp,
+                      log=lambda line: print(line, file=sys.stderr))
+    write_tablebase(args.out, engine.state.terrain, solved, args.max_units, args.max_hp)
+    print(f"{len(solved)} tables written to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Terrain map generation, fairness scoring and pools of approved maps.
+
+Only rows 3 and 4 get random terrain; the home rows of both players stay
+green. Each random square is drawn in turn from the colours still under
+their cap, so a map never has more than max_blue water squares, max_red
+red squares or max_gray gray squares.
+
+A map is approved when units stepping one square at a time (pawns,
+archers and generals; horses can jump water) can get from each side's
+home rows to a square they can attack the enemy tower from, and neither
+side needs more steps than the other beyond max_gap. Rejection sampling
+happens once, when a TerrainPool is filled, so starting a game only picks
+a map from the pool.
+"""
+import random
+from typing import NamedTuple
+
+from distances import UNREACHABLE, DistanceMaps
+from rules_engine import BLUE, BOARD_SIZE, GRAY, GREEN, RED
+
+TERRAIN_ROWS = (3, 4)  # Rows that get random terrain
+HOME_ROWS = {'P1': (0, 1), 'P2': (6, 7)}
+TOWER_SQUARES = {'T1': (3, 0), 'T2': (4, 7)}  # Where RulesEngine.place_pieces puts the towers
+ENEMY_TOWER = {'P1': 'T2', 'P2': 'T1'}
+_TOWERS = sum(1 << (row * BOARD_SIZE + col) for row, col in TOWER_SQUARES.values())
+
+POOL_SIZE = 256
+POOL_SEED = 'terrain-pool'
+
+
+class TerrainGenerator:
+    """Draws terrain maps for rows 3 and 4 under the blue, red and gray caps."""
+
+    def __init__(self, max_blue=6, max_red=2, max_gray=1):
+        self.max_blue = max_blue
+        self.max_red = max_red
+        self.max_gray = max_gray
+
+    def generate(self, rng):
+        """Return a new map as a bytearray of terrain codes, square = row * BOARD_SIZE + col."""
+        terrain = bytearray(BOARD_SIZE * BOARD_SIZE)  # All green
+        counts = {BLUE: 0, RED: 0, GRAY: 0}
+        caps = {BLUE: self.max_blue, RED: self.max_red, GRAY: self.max_gray}
+        for row in TERRAIN_ROWS:
+            for col in range(BOARD_SIZE):
+                colors = [color for color in (BLUE, GREEN, GRAY, RED) if color == GREEN or counts[color] < caps[color]]
+                color = rng.choice(colors)
+                if color != GREEN:
+                    counts[color] += 1
+                terrain[row * BOARD_SIZE + col] = color
+        return terrain
+
+
+class TerrainScore(NamedTuple):
+    symmetry: float  # Share of the random squares that match the square opposite them (180 degree turn)
+    distances: dict  # Steps from each player's home rows to a square attacking the enemy tower, or UNREACHABLE
+
+    def fair(self, max_gap=1, min_symmetry=0.0):
+        """Check if both sides can reach the enemy tower in about the same number of steps."""
+        p1, p2 = self.distances['P1'], self.distances['P2']
+        return UNREACHABLE not in (p1, p2) and abs(p1 - p2) <= max_gap and self.symmetry >= min_symmetry
+
+
+def score_terrain(terrain):
+    """Score a map for symmetry and for how far each side is from the enemy tower."""
+    squares = [row * BOARD_SIZE + col for row in TERRAIN_ROWS for col in range(BOARD_SIZE)]
+    last = BOARD_SIZE * BOARD_SIZE - 1
+    symmetry = sum(terrain[square] == terrain[last - square] for square in squares) / len(squares)
+
+    maps = DistanceMaps(terrain, blocked=_TOWERS)
+    distances = {}
+    for player, rows in HOME_ROWS.items():
+        tower_row, tower_col = TOWER_SQUARES[ENEMY_TOWER[player]]
+        to_tower = maps.to_tower('P', tower_row * BOARD_SIZE + tower_col)  # Pawns step like archers and generals
+        distances[player] = min(to_tower[row * BOARD_SIZE + col] for row in rows for col in range(BOARD_SIZE))
+    return TerrainScore(symmetry, distances)
+
+
+class TerrainPool:
+    """A fixed list of approved maps, filled once from its own seed.
+
+    The pool for given caps and seed is always the same, so a game that
+    draws from it with a seeded random stream still gets the same map on
+    every replay.
+    """
+
+    def __init__(self, generator=None, size=POOL_SIZE, seed=POOL_SEED, max_gap=1, min_symmetry=0.0,
+                 max_tries=100000):
+        self.generator = generator or TerrainGenerator()
+        rng = random.Random(f'{seed}/{self.generator.max_blue}/{self.generator.max_red}/{self.generator.max_gray}')
+        self.maps = []
+        for _ in range(max_tries):
+            terrain = self.generator.generate(rng)
+            if score_terrain(terrain).fair(max_gap, min_symmetry):
+                self.maps.append(bytes(terrain))
+                if len(self.maps) == size:
+                    break
+        if not self.maps:
+            raise ValueError("no map passed the fairness check")
+
+    def __len__(self):
+        return len(self.maps)
+
+    def draw(self, rng):
+        """Return a copy of a random map from the pool."""
+        return bytearray(rng.choice(self.maps))
+
+
+_pools = {}
+
+
+def terrain_pool(max_blue=6, max_red=2, max_gray=1):
+    """Return the shared pool for these caps, filling it on first use."""
+    key = (max_blue, max_red, max_gray)
+    if key not in _pools:
+        _pools[key] = TerrainPool(TerrainGenerator(*key))
+    return _pools[key]
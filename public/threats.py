@@ -0,0 +1,90 @@
+"""Which units can attack each square, kept up to date as the game goes on.
+
+A ThreatMap subscribes to a RulesEngine and follows its Moved and Killed
+events, so asking whether a square is attacked, or by whom, is a lookup
+instead of trying is_valid_attack from every enemy piece. Only the piece
+that moved or died is recomputed, using the bitboards attack masks
+(adjacent squares for melee units, 3 squares in cross direction for
+Archers and 4 for General Hunters).
+"""
+from bitboards import ATTACK_MASKS, NUM_SQUARES, PLAYERS, iter_squares, piece_type
+from events import Killed, Moved
+from rules_engine import BOARD_SIZE, PIECE_KINDS, PIECE_NAMES, RED, is_tower
+
+
+class ThreatMap:
+    """Per-player attack coverage of every square.
+
+    attackers[player][square] is the mask of squares holding the player's
+    units that have square in attack range, and threatened[player] is the
+    mask of squares with at least one such unit. Build it once the pieces
+    are on the board; it follows the engine from then on until close().
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.rebuild()
+        engine.subscribe(self.on_event)
+
+    def rebuild(self):
+        """Recompute every map from the board."""
+        self.attackers = {player: [0] * NUM_SQUARES for player in PLAYERS}
+        self.threatened = {player: 0 for player in PLAYERS}
+        for square, piece in enumerate(self.engine.state.board):
+            if piece:
+                self._add(PIECE_NAMES[piece], square)
+
+    def close(self):
+        self.engine.unsubscribe(self.on_event)
+
+    def on_event(self, event):
+        if isinstance(event, Moved):
+            self._remove(event.piece, event.from_square[0] * BOARD_SIZE + event.from_square[1])
+            self._add(event.piece, event.to_square[0] * BOARD_SIZE + event.to_square[1])
+        elif isinstance(event, Killed):
+            self._remove(event.piece, event.square[0] * BOARD_SIZE + event.square[1])
+
+    def _add(self, piece, square):
+        player = 'P' + piece[-1]
+        attackers = self.attackers[player]
+        bit = 1 << square
+        for target in iter_squares(ATTACK_MASKS[piece_type(piece)][square]):
+            attackers[target] |= bit
+        self.threatened[player] |= ATTACK_MASKS[piece_type(piece)][square]
+
+    def _remove(self, piece, square):
+        player = 'P' + piece[-1]
+        attackers = self.attackers[player]
+        bit = 1 << square
+        threatened = self.threatened[player]
+        for target in iter_squares(ATTACK_MASKS[piece_type(piece)][square]):
+            attackers[target] &= ~bit
+            if not attackers[target]:
+                threatened &= ~(1 << target)
+        self.threatened[player] = threatened
+
+    def is_attacked(self, row, col, by):
+        """Check if any unit of player by has (row, col) in attack range."""
+        return bool(self.threatened[by] >> (row * BOARD_SIZE + col) & 1)
+
+    def attackers_of(self, row, col, by):
+        """Return the (row, col) squares of player by's units that have (row, col) in attack range."""
+        return [divmod(square, BOARD_SIZE) for square in iter_squares(self.attackers[by][row * BOARD_SIZE + col])]
+
+    def targets(self, row, col):
+        """Return the (row, col) squares of the enemy pieces the piece on (row, col) can attack right now."""
+        state = self.engine.state
+        square = row * BOARD_SIZE + col
+        piece = state.board[square]
+        if not piece:
+            return []
+        on_red = state.terrain[square] == RED
+        targets = []
+        for square in iter_squares(ATTACK_MASKS[PIECE_KINDS[piece]][square]):
+            target = state.board[square]
+            if not target or target & 1 == piece & 1:
+                continue
+            if on_red and is_tower(target):
+                continue  # Towers cannot be hit from red terrain
+            targets.append(divmod(square, BOARD_SIZE))
+        return targets
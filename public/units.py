@@ -0,0 +1,63 @@
+"""The unit registry: what every piece type can do, as data.
+
+Each UnitType declares its movement and attack patterns, dodge chance,
+tower damage and special rules. rules_engine and bitboards compile the
+patterns into lookup tables at import time, so the rules look a piece's
+type up once per action instead of walking a chain of startswith checks.
+A new general is one more UnitType in UNITS.
+
+Patterns are predicates on the distance (dr, dc) in rows and columns,
+both non-negative, between the square a unit stands on and a target
+square. They never see (0, 0).
+"""
+from typing import Callable, NamedTuple
+
+
+def step(dr, dc):
+    """One square in any direction."""
+    return dr <= 1 and dc <= 1
+
+
+def gallop(dr, dc):
+    """Up to 3 squares in cross or diagonal direction, jumping over anything in the way."""
+    return (dr == 0 or dc == 0 or dr == dc) and max(dr, dc) <= 3
+
+
+def cross(reach):
+    """Return a pattern of 1 to reach squares in cross direction."""
+    def pattern(dr, dc):
+        return (dr == 0 or dc == 0) and max(dr, dc) <= reach
+    pattern.__name__ = f'cross{reach}'
+    return pattern
+
+
+def nowhere(dr, dc):
+    return False
+
+
+CROSS_3 = cross(3)
+CROSS_4 = cross(4)
+
+
+class UnitType(NamedTuple):
+    name: str
+    moves: Callable  # Squares it can move to
+    attacks: Callable  # Squares it can attack
+    dodge: float  # Chance of dodging an attack, unless the attacker stands on red terrain
+    tower_damage: int  # Hit points an attack on a tower takes off
+    value: float  # Material value for the computer players
+    counter_attacks: bool = False  # After dodging, strikes back at attackers that provoke it
+    provokes_counter: bool = True  # Archers and generals attack without drawing a counter-attack
+    tower: bool = False
+
+
+UNITS = {unit.name: unit for unit in (
+    UnitType('P', step, step, dodge=0.7, tower_damage=2, value=1.0),  # Pawn
+    UnitType('H', gallop, step, dodge=0.5, tower_damage=2, value=3.0),  # Horse
+    UnitType('A', step, CROSS_3, dodge=0.0, tower_damage=1, value=3.0, provokes_counter=False),  # Archer
+    UnitType('GW', step, step, dodge=0.8, tower_damage=2, value=5.0, counter_attacks=True,
+             provokes_counter=False),  # General Warrior
+    UnitType('GH', step, CROSS_4, dodge=0.5, tower_damage=1, value=5.0, provokes_counter=False),  # General Hunter
+    UnitType('GR', gallop, step, dodge=0.7, tower_damage=2, value=4.0, provokes_counter=False),  # General Horse
+    UnitType('T', nowhere, nowhere, dodge=0.0, tower_damage=0, value=0.0, tower=True),  # Tower
+)}
@@ -0,0 +1,135 @@
+"""Zobrist position keys and a fixed-size transposition table.
+
+A position key is the XOR of one random 64-bit number per (piece, square),
+per (terrain code, square), per (tower, hit points) and one for whose turn
+it is and how many of its two actions are used. GameState keeps the
+board, terrain and tower part in state.key, and the RulesEngine updates it
+with a couple of XORs whenever a piece moves or dies or a tower is hit;
+position_key() mixes in the turn when asked.
+
+The random numbers are drawn from string seeds, so every process builds
+the same keys.
+"""
+import random
+from array import array
+
+
+class _KeyTable(dict):
+    """One random 64-bit key per index, made on first use."""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def __missing__(self, index):
+        key = self[index] = random.Random(f'zobrist/{self.name}/{index}').getrandbits(64)
+        return key
+
+
+class _SquareKeys(dict):
+    """A list of one random 64-bit key per square for each item, made on first use."""
+
+    def __init__(self, name, squares=64):
+        super().__init__()
+        self.name = name
+        self.squares = squares
+
+    def __missing__(self, item):
+        rng = random.Random(f'zobrist/{self.name}/{item}')
+        keys = self[item] = [rng.getrandbits(64) for _ in range(self.squares)]
+        return keys
+
+
+PIECE_KEYS = _SquareKeys('piece')  # PIECE_KEYS[piece code][square]
+TERRAIN_KEYS = _SquareKeys('terrain')  # TERRAIN_KEYS[terrain code][square]
+TOWER_HP_KEYS = (_KeyTable('T1'), _KeyTable('T2'))  # TOWER_HP_KEYS[owner][hp]
+SIDE_KEYS = _KeyTable('side')  # SIDE_KEYS[turn, move_count]
+
+
+def compute_key(state):
+    """Compute the board, terrain and tower part of state's key from scratch."""
+    key = 0
+    for square, code in enumerate(state.terrain):
+        key ^= TERRAIN_KEYS[code][square]
+    for square, piece in enumerate(state.board):
+        if piece:
+            key ^= PIECE_KEYS[piece][square]
+    for owner, hp in enumerate(state.tower_hp):
+        key ^= TOWER_HP_KEYS[owner][hp]
+    return key
+
+
+def position_key(state):
+    """Return the full key of state: board, terrain, tower HP, turn and move count."""
+    return state.key ^ SIDE_KEYS[state.turn, state.move_count]
+
+
+# How a stored value relates to the real value of the position
+EXACT, LOWER, UPPER = range(3)
+NO_ACTION = 0  # Stored when there is no best action; never a legal action, as it moves square 0 to itself
+
+
+class TranspositionTable:
+    """Fixed-size table of search results indexed by position key.
+
+    Each key maps to one slot (the low bits of the key). A new result
+    replaces the one in its slot unless that one is from the same search
+    and was searched deeper, in which case the new result is dropped.
+    hits, misses, stores and overwrites count how the table is used.
+    """
+
+    def __init__(self, size=1 << 16):
+        if size & (size - 1):
+            raise ValueError("size must be a power of two")
+        self.mask = size - 1
+        self.keys = array('Q', bytes(8 * size))
+        self.values = array('d', bytes(8 * size))
+        self.depths = array('b', bytes(size))
+        self.bounds = array('B', bytes(size))
+        self.actions = array('H', bytes(2 * size))
+        self.ages = array('H', bytes(2 * size))
+        self.age = 1  # Slots with age 0 are empty
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def new_search(self):
+        """Mark the entries stored so far as old, so the next search may replace them first."""
+        self.age = self.age % 0xFFFF + 1
+
+    def clear(self):
+        size = len(self.keys)
+        self.ages = array('H', bytes(2 * size))
+        self.age = 1
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def probe(self, key):
+        """Return (depth, value, bound, action) stored for key, or None."""
+        slot = key & self.mask
+        if self.ages[slot] and self.keys[slot] == key:
+            self.hits += 1
+            return self.depths[slot], self.values[slot], self.bounds[slot], self.actions[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, bound, action=NO_ACTION):
+        slot = key & self.mask
+        age = self.ages[slot]
+        if age == self.age and self.depths[slot] > depth:
+            return  # Keep the deeper result of this search
+        if age and self.keys[slot] != key:
+            self.overwrites += 1
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.actions[slot] = action
+        self.ages[slot] = self.age
+        self.stores += 1
+
+    def stats(self):
+        """Return the usage counters and the share of probes that hit."""
+        probes = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'overwrites': self.overwrites,
+                'hit_rate': self.hits / probes if probes else 0.0}